@@ -2,17 +2,21 @@ from __future__ import annotations
 from typing import Optional, Tuple, TYPE_CHECKING
 
 import colors
+from entity import Item
 from equipment_types import EquipmentType
 import exceptions
+from scheduler import TURN
 
 if TYPE_CHECKING:
   from engine import Engine
-  from entity import Actor, Entity, Item
+  from entity import Actor, Entity
 
 """
 Base action class
 """
 class Action:
+  cost = TURN # Time this action takes at normal speed, more than a TURN for slow actions
+
   def __init__(self, entity: Actor) -> None:
     super().__init__()
     self.entity = entity
@@ -81,7 +85,7 @@ class MovementAction(ActionWithDirection):
 
     if not self.engine.game_map.in_bounds(dest_x, dest_y):
       raise exceptions.Impossible("The way is blocked")
-    if not self.engine.game_map.tiles["walkable"][dest_x, dest_y]:
+    if not self.engine.game_map.walkable[dest_x, dest_y]:
       raise exceptions.Impossible("The way is blocked")
     if self.engine.game_map.get_blocking_entity_at_location(dest_x, dest_y):
       raise exceptions.Impossible("The way is blocked")
@@ -146,12 +150,12 @@ class PickupAction(Action):
     actor_y = self.entity.y
     inventory = self.entity.inventory
 
-    for item in self.engine.game_map.items:
-      if actor_x == item.x and actor_y == item.y:
+    for item in self.engine.game_map.get_entities_at_location(actor_x, actor_y):
+      if isinstance(item, Item):
         if len(inventory.items) >= inventory.capacity:
           raise exceptions.Impossible("You cannot pick up this item, your inventory is full")
 
-        self.engine.game_map.entities.remove(item)
+        self.engine.game_map.remove_entity(item)
         item.parent = self.entity.inventory
         inventory.items.append(item)
         self.engine.message_log.add_message(f"You pick up the {item.name}")
@@ -179,6 +183,8 @@ class TakeStairsDownAction(Action):
       self.engine.message_log.add_message(
         "You descend the staircase.", colors.descend
       )
+      if self.engine.autosaver:
+        self.engine.autosaver.request_save()
     else:
       raise exceptions.Impossible("There are no stairs here.")
 
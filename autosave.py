@@ -0,0 +1,92 @@
+from __future__ import annotations
+import queue
+import threading
+from typing import Optional, Tuple, TYPE_CHECKING
+
+import colors
+import savefile
+
+if TYPE_CHECKING:
+  from engine import Engine
+
+
+class AutoSaver:
+  """
+  Saves the game every interval turns and whenever a save is requested,
+  like after taking the stairs.
+  The current floor and the engine are snapshotted on the main thread,
+  compressing and writing them happens on a worker thread, which also copies
+  in the floors the floor cache has saved. Only the newest waiting snapshot
+  is written, older ones are dropped if the worker is still busy.
+  """
+
+  def __init__(self, filename: str, interval: int = 100, codec: str = savefile.DEFAULT_CODEC):
+    self.filename = filename
+    self.interval = interval
+    self.codec = codec
+    self._save_requested = False
+    self._condition = threading.Condition()
+    self._pending: Optional[Tuple[int, savefile.Snapshot]] = None
+    self._closed = False
+    # (turn, error) for each finished save, reported on the main thread
+    self._results: queue.SimpleQueue[Tuple[int, Optional[Exception]]] = queue.SimpleQueue()
+    self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+    self._thread.start()
+
+  def request_save(self) -> None:
+    """Save at the end of the current turn"""
+    self._save_requested = True
+
+  def turn_ended(self, engine: Engine) -> None:
+    if not engine.player.is_alive:
+      return # Dead games are not worth saving, the save is deleted on quit
+    if self._save_requested or (self.interval and engine.turn % self.interval == 0):
+      self._save_requested = False
+      self.save(engine)
+
+  def save(self, engine: Engine) -> None:
+    """Snapshot the engine now and write it in the background"""
+    sections = savefile.snapshot(engine)
+    with self._condition:
+      if self._closed:
+        savefile.discard(sections)
+        return
+      if self._pending is not None:
+        savefile.discard(self._pending[1]) # Replaced by this newer snapshot
+      self._pending = engine.turn, sections
+      self._condition.notify()
+
+  def report(self, engine: Engine) -> None:
+    """Add the results of finished saves to the message log"""
+    while True:
+      try:
+        turn, error = self._results.get_nowait()
+      except queue.Empty:
+        return
+      if error is None:
+        engine.message_log.add_message("Game autosaved.", colors.text_color)
+      else:
+        engine.message_log.add_message(f"Autosave on turn {turn} failed: {error}", colors.error)
+
+  def close(self) -> None:
+    """Finish writing the pending snapshot and stop the worker"""
+    with self._condition:
+      self._closed = True
+      self._condition.notify()
+    self._thread.join()
+
+  def _run(self) -> None:
+    while True:
+      with self._condition:
+        while self._pending is None and not self._closed:
+          self._condition.wait()
+        if self._pending is None:
+          return
+        turn, sections = self._pending
+        self._pending = None
+      try:
+        savefile.write(sections, self.filename, self.codec)
+      except Exception as exc:
+        self._results.put((turn, exc))
+      else:
+        self._results.put((turn, None))
@@ -0,0 +1,100 @@
+"""
+Run the benchmark scenarios and optionally compare them against a baseline.
+
+  python -m benchmarks --output results.json
+  python -m benchmarks --baseline baseline.json --threshold 0.25
+
+Run from the repository root. The exit status is 1 when any scenario's
+median time is slower than the baseline by more than the threshold.
+"""
+from __future__ import annotations
+import argparse
+import fnmatch
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np # type: ignore
+import tcod
+
+from benchmarks.scenarios import SCENARIOS
+
+
+def time_scenario(name: str, repeat: int) -> Dict[str, float]:
+  samples: List[float] = []
+  for _ in range(repeat):
+    run = SCENARIOS[name]()
+    start = time.perf_counter()
+    run()
+    samples.append(time.perf_counter() - start)
+  return {
+    "min": min(samples),
+    "median": statistics.median(samples),
+    "mean": statistics.fmean(samples),
+    "repeat": repeat,
+  }
+
+
+def compare(
+  results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float
+) -> List[str]:
+  """Print the change against baseline for each scenario and return those which regressed"""
+  regressions = []
+  for name, result in results.items():
+    if name not in baseline:
+      print(f"{name:<22} (not in baseline)")
+      continue
+    ratio = result["median"] / baseline[name]["median"]
+    flag = ""
+    if ratio > 1 + threshold:
+      flag = "  REGRESSION"
+      regressions.append(name)
+    print(f"{name:<22} {ratio:6.2f}x baseline{flag}")
+  return regressions
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Run the benchmark scenarios.")
+  parser.add_argument("--repeat", type=int, default=5, help="timed runs of each scenario")
+  parser.add_argument("--filter", default="*", help="only run scenarios matching this glob")
+  parser.add_argument("--output", help="write the results to this JSON file")
+  parser.add_argument("--baseline", help="compare against a JSON file written by --output")
+  parser.add_argument(
+    "--threshold", type=float, default=0.2, help="allowed slowdown before flagging, 0.2 is 20%%"
+  )
+  args = parser.parse_args()
+
+  results: Dict[str, Dict[str, float]] = {}
+  for name in SCENARIOS:
+    if not fnmatch.fnmatch(name, args.filter):
+      continue
+    results[name] = time_scenario(name, args.repeat)
+    print(f"{name:<22} median {results[name]['median'] * 1000:10.3f} ms")
+
+  if args.output:
+    report = {
+      "meta": {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "tcod": tcod.__version__,
+        "machine": platform.machine(),
+      },
+      "results": results,
+    }
+    with open(args.output, "w") as f:
+      json.dump(report, f, indent=2)
+
+  if args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)["results"]
+    print()
+    if compare(results, baseline, args.threshold):
+      sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,89 @@
+"""
+Report the memory used per entity by the slotted entity and component classes.
+
+The "dict" column rebuilds the same entities as plain objects with a
+per-instance __dict__, which is how they were stored before __slots__.
+Each slotted class gets its own dict class and instances are filled in the
+way copy.deepcopy filled in the entities the old spawn copied from templates.
+
+Run from the repository root with: python -m benchmarks.memory
+"""
+from __future__ import annotations
+import argparse
+import enum
+import pickle
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import entity_factories # Registers the templates with prototypes
+import prototypes
+
+TEMPLATES = ("player", "orc", "troll", "health_potion", "fireball_scroll", "dagger", "chain_mail")
+
+
+_dict_classes: Dict[type, type] = {}
+
+
+def dict_class(cls: type) -> type:
+  """Return a plain class with a __dict__ standing in for a slotted class"""
+  if cls not in _dict_classes:
+    dict_cls = type(cls.__name__, (), {"__module__": __name__})
+    globals()[cls.__name__] = dict_cls # Found by pickle under the same name
+    _dict_classes[cls] = dict_cls
+  return _dict_classes[cls]
+
+
+def as_dict_object(obj: Any, copies: Dict[int, Any]) -> Any:
+  """Copy an object graph of slotted objects into dict class instances holding the same fields"""
+  if id(obj) in copies:
+    return copies[id(obj)]
+  if not prototypes._has_fields(obj) or isinstance(obj, type):
+    return obj
+  if isinstance(obj, enum.Enum):
+    return obj
+  copy = dict_class(type(obj))()
+  copies[id(obj)] = copy
+  state: Dict[str, Any] = {}
+  for name, value in prototypes._fields(obj):
+    if isinstance(value, list):
+      value = [as_dict_object(element, copies) for element in value]
+    else:
+      value = as_dict_object(value, copies)
+    state[name] = value
+  copy.__dict__.update(state) # As copy.deepcopy filled them in when the old spawn copied a template
+  return copy
+
+
+def measure(build: Callable[[], Any], count: int) -> float:
+  """Return the bytes allocated per object by calling build count times"""
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  kept: List[Any] = [build() for _ in range(count)]
+  after = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  list_overhead = len(kept) * 8 # Pointers held by the list itself
+  return (after - before - list_overhead) / count
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("--count", type=int, default=10_000, help="entities built per template")
+  args = parser.parse_args()
+
+  print(f"{'template':<16}{'dict B':>10}{'slots B':>10}{'saved':>8}{'pickle dict':>13}{'pickle slots':>14}")
+  for name in TEMPLATES:
+    template = prototypes.get(name)
+    slotted_size = measure(lambda: prototypes.instantiate(template), args.count)
+    # Copied from the template itself, like the old spawn did
+    dict_size = measure(lambda: as_dict_object(template, {}), args.count)
+    slotted_pickle = len(pickle.dumps(prototypes.instantiate(template)))
+    dict_pickle = len(pickle.dumps(as_dict_object(template, {})))
+    saved = 1 - slotted_size / dict_size
+    print(
+      f"{name:<16}{dict_size:>10.0f}{slotted_size:>10.0f}{saved:>8.0%}"
+      f"{dict_pickle:>13}{slotted_pickle:>14}"
+    )
+
+
+if __name__ == "__main__":
+  main()
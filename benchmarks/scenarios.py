@@ -0,0 +1,175 @@
+"""
+Seeded benchmark scenarios.
+
+Each scenario is a setup function which builds its world (untimed) and returns
+the function to be timed. Setup runs again before every repeat so scenarios
+which change the world, like enemy turns, always start from the same state.
+"""
+from __future__ import annotations
+import os
+import random
+import tempfile
+from typing import Callable, Dict, List, Tuple, TYPE_CHECKING
+import numpy as np # type: ignore
+import tcod
+
+import entity_factories
+from game_map import GameMap
+from message_log import MessageLog
+import procgen
+import setup_game
+import tile_types
+
+if TYPE_CHECKING:
+  from engine import Engine
+
+Scenario = Callable[[], Callable[[], None]]
+SEED = 1234
+
+
+def _new_engine() -> Engine:
+  engine = setup_game.new_game(seed=SEED)
+  engine.game_world.pregenerate = False
+  return engine
+
+
+def _arena(engine: Engine, width: int, height: int) -> GameMap:
+  """Replace the engine's map with an open room with the player in the middle"""
+  arena = GameMap(engine, width, height)
+  arena.tiles[1:-1, 1:-1] = tile_types.floor
+  arena.mark_tiles_changed()
+  engine.player.place(width // 2, height // 2, arena)
+  engine.game_map = arena
+  return arena
+
+
+def procgen_scenario(width: int, height: int, max_rooms: int) -> Scenario:
+  def setup() -> Callable[[], None]:
+    engine = _new_engine()
+
+    def run() -> None:
+      rng, np_rng = engine.game_world.floor_random(SEED, 1)
+      procgen.generate_dungeon(
+        max_rooms=max_rooms,
+        room_min_size=6,
+        room_max_size=10,
+        map_width=width,
+        map_height=height,
+        engine=engine,
+        floor_number=1,
+        rng=rng,
+        np_rng=np_rng,
+      )
+    return run
+  return setup
+
+
+def enemy_turns_scenario(monsters: int, turns: int = 5, awake: bool = True) -> Scenario:
+  def setup() -> Callable[[], None]:
+    engine = _new_engine()
+    size = max(40, int((monsters * 4) ** 0.5))
+    arena = _arena(engine, size, size)
+    # The player must survive every repeat so the monsters keep chasing
+    engine.player.fighter.max_hp = engine.player.fighter.hp = 10 ** 9
+    rng = random.Random(SEED)
+    free = [
+      (x, y) for x in range(1, size - 1) for y in range(1, size - 1)
+      if (x, y) != (engine.player.x, engine.player.y)
+    ]
+    orcs = []
+    for x, y in rng.sample(free, monsters):
+      orc = entity_factories.orc.spawn(arena, x, y)
+      orc.ai.sleeping = not awake
+      if awake:
+        arena.activate(orc) # Awake orcs act even where the player can't see them
+      orcs.append(orc)
+    engine.update_fov()
+    # Every awake orc takes turns, sleeping ones only once the player sees them
+    for orc in orcs:
+      expected = awake or bool(arena.visible[orc.x, orc.y])
+      assert (orc in arena.scheduler) == expected, f"orc at {orc.x},{orc.y} is not scheduled as expected"
+
+    def run() -> None:
+      for _ in range(turns):
+        engine.handle_enemy_turns()
+    return run
+  return setup
+
+
+def fov_scenario(moves: int = 200) -> Scenario:
+  def setup() -> Callable[[], None]:
+    engine = _new_engine()
+    game_map = engine.game_map
+    walkable = np.argwhere(game_map.walkable)
+    rng = np.random.default_rng(SEED)
+    positions: List[Tuple[int, int]] = [
+      (int(x), int(y)) for x, y in walkable[rng.integers(0, len(walkable), moves)]
+    ]
+
+    def run() -> None:
+      for x, y in positions:
+        engine.player.place(x, y)
+        engine.update_fov()
+    return run
+  return setup
+
+
+def render_scenario(full_redraw: bool, frames: int = 50) -> Scenario:
+  def setup() -> Callable[[], None]:
+    engine = _new_engine()
+    game_map = engine.game_map
+    game_map.expolored[:] = True
+    console = tcod.Console(game_map.width, game_map.height, order="F")
+    game_map.render(console)
+
+    def run() -> None:
+      for _ in range(frames):
+        if full_redraw:
+          game_map._clear_render_cache()
+        game_map.render(console)
+    return run
+  return setup
+
+
+def message_log_scenario(messages: int) -> Scenario:
+  def setup() -> Callable[[], None]:
+    log = MessageLog()
+    rng = random.Random(SEED)
+    for i in range(messages):
+      log.add_message(f"Message {i} " + "word " * rng.randint(1, 30))
+    console = tcod.Console(80, 50, order="F")
+
+    def run() -> None:
+      MessageLog.render_messages(console, 1, 1, 78, 48, log.messages)
+    return run
+  return setup
+
+
+def save_load_scenario() -> Scenario:
+  def setup() -> Callable[[], None]:
+    engine = _new_engine()
+    filename = os.path.join(tempfile.gettempdir(), f"rogue-bench-{os.getpid()}.sav")
+
+    def run() -> None:
+      engine.save_as(filename)
+      setup_game.load_game(filename)
+      os.remove(filename)
+    return run
+  return setup
+
+
+SCENARIOS: Dict[str, Scenario] = {
+  "procgen_80x43": procgen_scenario(80, 43, 30),
+  "procgen_200x200": procgen_scenario(200, 200, 300),
+  "procgen_1000x1000": procgen_scenario(1000, 1000, 8000),
+  "enemy_turns_10": enemy_turns_scenario(10),
+  "enemy_turns_100": enemy_turns_scenario(100),
+  "enemy_turns_1000": enemy_turns_scenario(1000),
+  "enemy_turns_5000_asleep": enemy_turns_scenario(5000, awake=False),
+  "update_fov": fov_scenario(),
+  "render_cached": render_scenario(full_redraw=False),
+  "render_full": render_scenario(full_redraw=True),
+  "message_log_1000": message_log_scenario(1000),
+  "message_log_100000": message_log_scenario(100_000),
+  "save_load": save_load_scenario(),
+}
@@ -0,0 +1,98 @@
+from __future__ import annotations
+from typing import Any, Optional, Tuple
+import numpy as np # type: ignore
+
+
+class BitMask:
+  """
+  A 2D boolean array packed to one bit per cell, used in place of a bool array
+  for a maps visible and explored layers.
+  Indexing works like the bool array it replaces: mask[x, y] returns a bool,
+  mask[x_slice, y_slice] and mask[xs, ys] return bool arrays and the same keys
+  can be assigned to. Reading or writing a rectangle only unpacks the bytes
+  covering it, so updating the FOV bounding box never touches the whole map.
+  """
+  __slots__ = ("shape", "bits")
+  dtype = np.dtype(bool)
+
+  def __init__(self, shape: Tuple[int, int], bits: Optional[np.ndarray] = None):
+    self.shape = shape
+    # Each row of bits packs the y axis of one x, most significant bit first
+    if bits is None:
+      bits = np.zeros((shape[0], (shape[1] + 7) // 8), dtype=np.uint8)
+    self.bits = bits
+
+  @classmethod
+  def from_array(cls, array: np.ndarray) -> BitMask:
+    return cls(array.shape, np.packbits(np.asarray(array, dtype=bool), axis=1))
+
+  @property
+  def nbytes(self) -> int:
+    return self.bits.nbytes
+
+  def to_array(self) -> np.ndarray:
+    return np.unpackbits(self.bits, axis=1, count=self.shape[1]).astype(bool)
+
+  def __array__(self, dtype: Any = None, copy: Any = None) -> np.ndarray:
+    array = self.to_array()
+    return array if dtype is None else array.astype(dtype)
+
+  def any(self) -> bool:
+    return bool(self.bits.any())
+
+  def count(self) -> int:
+    """Return the number of cells which are set"""
+    return int(np.unpackbits(self.bits, axis=1, count=self.shape[1]).sum())
+
+  def _key(self, key: Any) -> Tuple[Any, Any]:
+    if key is Ellipsis:
+      return slice(None), slice(None)
+    if isinstance(key, np.ndarray) and key.dtype == bool and key.ndim == 2:
+      return np.nonzero(key) # A mask of the whole array selects cells like xs, ys
+    if not isinstance(key, tuple):
+      return key, slice(None)
+    return key
+
+  def _rows(self, key_y: slice) -> Optional[Tuple[slice, slice]]:
+    """Return the byte columns covering a contiguous y slice and the y slice within them"""
+    start, stop, step = key_y.indices(self.shape[1])
+    if step != 1:
+      return None
+    stop = max(start, stop)
+    first_byte = start // 8
+    return slice(first_byte, (stop + 7) // 8), slice(start - first_byte * 8, stop - first_byte * 8)
+
+  def __getitem__(self, key: Any) -> Any:
+    key_x, key_y = self._key(key)
+    if isinstance(key_y, (int, np.integer)) and isinstance(key_x, (int, np.integer)):
+      return bool(self.bits[key_x, key_y >> 3] & (0x80 >> (key_y & 7)))
+    if isinstance(key_y, slice) and isinstance(key_x, slice):
+      rows = self._rows(key_y)
+      if rows is not None:
+        byte_columns, y_range = rows
+        return np.unpackbits(self.bits[key_x, byte_columns], axis=1)[:, y_range].astype(bool)
+    if not isinstance(key_x, slice) and not isinstance(key_y, slice):
+      xs, ys = np.asarray(key_x), np.asarray(key_y)
+      return (self.bits[xs, ys >> 3] & (0x80 >> (ys & 7))) != 0
+    return self.to_array()[key_x, key_y]
+
+  def __setitem__(self, key: Any, value: Any) -> None:
+    key_x, key_y = self._key(key)
+    if isinstance(key_y, (int, np.integer)) and isinstance(key_x, (int, np.integer)):
+      bit = 0x80 >> (key_y & 7)
+      if value:
+        self.bits[key_x, key_y >> 3] |= bit
+      else:
+        self.bits[key_x, key_y >> 3] &= ~bit & 0xFF
+      return
+    if isinstance(key_y, slice) and isinstance(key_x, slice):
+      rows = self._rows(key_y)
+      if rows is not None:
+        byte_columns, y_range = rows
+        region = np.unpackbits(self.bits[key_x, byte_columns], axis=1)
+        region[:, y_range] = value
+        self.bits[key_x, byte_columns] = np.packbits(region, axis=1)
+        return
+    array = self.to_array()
+    array[key_x, key_y] = value
+    self.bits[...] = np.packbits(array, axis=1)
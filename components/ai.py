@@ -1,8 +1,7 @@
 from __future__ import annotations
-from typing import List, Optional, Tuple, TYPE_CHECKING
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 import numpy as np
 import tcod
-import random
 
 from actions import (
   Action, 
@@ -11,47 +10,152 @@ from actions import (
   MovementAction, 
   WaitAction
 )
+from scheduler import TURN
 
 if TYPE_CHECKING:
   from entity import Actor
 
+# (start, goal, blocker version) a cached path was last checked at
+PathKey = Tuple[Tuple[int, int], Tuple[int, int], int]
+
 class BaseAI(Action):
+  last_action_cost = TURN # Set by act, the engine reschedules the actor after this long
 
   def perform(self) -> None:
     raise NotImplementedError()
 
+  @property
+  def is_dormant(self) -> bool:
+    """True if performing would do nothing until the actor is activated again"""
+    return False
+
+  def act(self, action: Action) -> None:
+    """Perform an action for this actor, its cost decides when the actor acts next"""
+    self.last_action_cost = action.cost
+    action.perform()
+
   def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
     """Compute and return a path to the target position. If there is no
     value path then return an empty list"""
-    # Copy the walkable array
-    cost = np.array(self.entity.game_map.tiles["walkable"], dtype=np.int8)
-
-    for entity in self.entity.game_map.entities:
-      # Check that an entity blocks movement and the cost isn't zero
-      if entity.blocks_movement and cost[entity.x, entity.y]:
-        # Add to the cost of a blocked position
-        # A lower number means more enemies will crowd behind each other,
-        # a higher number means enemies will take longer paths in order
-        # to surround the player
-        cost[entity.x, entity.y] += 10
+    player = self.engine.player
+    if (dest_x, dest_y) == (player.x, player.y):
+      # Chasing the player, walk downhill on the shared distance map when there is one
+      distance_map = self.engine.get_player_distance_map()
+      if distance_map is not None:
+        return self.get_path_downhill(distance_map)
+
+    return self.get_path_between((self.entity.x, self.entity.y), (dest_x, dest_y))
+
+  def get_path_between(self, start: Tuple[int, int], goal: Tuple[int, int]) -> List[Tuple[int, int]]:
+    """Return the path from start to goal without start, empty if there is none"""
+    cost = self.entity.game_map.get_path_cost()
 
     # Create a graph from the cost array and pass that graph to a pathfinder
     graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=0) # diagonal=0 means cardinal moves only
     pathfinder = tcod.path.Pathfinder(graph)
-    pathfinder.add_root((self.entity.x, self.entity.y)) # start position
+    pathfinder.add_root(start)
 
     # compute the path to the destination and remove the starting point
-    path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
+    path: List[List[int]] = pathfinder.path_to(goal)[1:].tolist()
 
     # convert from List[List[int]] to List[Tuple[int, int]]
     return [(index[0], index[1]) for index in path]
 
+  def get_path_downhill(
+    self, distance_map: np.ndarray, start: Optional[Tuple[int, int]] = None
+  ) -> List[Tuple[int, int]]:
+    """Follow a Dijkstra distance map from start, this entity by default, down to its lowest point"""
+    if start is None:
+      start = self.entity.x, self.entity.y
+    path: List[List[int]] = tcod.path.hillclimb2d(
+      distance_map, start, cardinal=True, diagonal=False
+    )[1:].tolist()
+    return [(index[0], index[1]) for index in path]
+
 
 class HostileEnemy(BaseAI):
+  # Turns out of sight with nowhere to go before falling asleep again, None never does.
+  # Asleep enemies are dormant and skipped on enemy turns until woken
+  sleep_after: Optional[int] = None
+  max_detour = 8   # Longest detour around a blocker before the whole path is recomputed
+  # Class defaults for enemies from older saves
+  idle_turns = 0
+  path_index = 0
+  path_key: Optional[PathKey] = None
+  _path_steps: Dict[Tuple[int, int], int] # Index of each cell in path, set along with path_key
+
   def __init__(self, entity: Actor):
     super().__init__(entity)
+    # Cells to walk through, path[path_index] is the next step
     self.path: List[Tuple[int, int]] = []
+    self.path_index = 0
+    self.path_key = None
     self.sleeping = True
+    self.idle_turns = 0
+
+  @property
+  def is_dormant(self) -> bool:
+    return self.sleeping and not self.has_path
+
+  @property
+  def has_path(self) -> bool:
+    return self.path_index < len(self.path)
+
+  def set_path(self, path: List[Tuple[int, int]], goal: Tuple[int, int]) -> None:
+    self.path = path
+    self.path_index = 0
+    self._path_steps = {cell: i for i, cell in enumerate(path)}
+    self.path_key = (self.entity.x, self.entity.y), goal, self.entity.game_map.blocker_version
+
+  def path_is_valid(self, goal: Tuple[int, int]) -> bool:
+    """Return True if the remaining path still leads from here to goal.
+    A path one blocker has stepped onto since it was checked is repaired around it"""
+    if self.path_key is None or not self.has_path:
+      return False
+    start, path_goal, version = self.path_key
+    if path_goal != goal or start != (self.entity.x, self.entity.y):
+      return False
+    game_map = self.entity.game_map
+    changes = game_map.blocker_changes_since(version)
+    if changes is None:
+      return False
+
+    # Where each blocker which moved since stands now, this actors own steps don't count
+    locations = {mover: new for _, mover, _, new in changes if mover is not self.entity}
+    blocked = {
+      location
+      for location in locations.values()
+      if location is not None and location != goal
+      and self._path_steps.get(location, -1) >= self.path_index
+    }
+    if len(blocked) > 1 or (blocked and not self.repair_path(blocked.pop())):
+      return False
+    self.path_key = start, goal, game_map.blocker_version
+    return True
+
+  def repair_path(self, cell: Tuple[int, int]) -> bool:
+    """Replace the step onto a blocked cell with a detour to the step after it"""
+    step = self._path_steps[cell]
+    if step + 1 >= len(self.path):
+      return False
+    before = self.path[step - 1] if step > self.path_index else (self.entity.x, self.entity.y)
+    player = self.engine.player
+    if self.path_key is not None and self.path_key[1] == (player.x, player.y):
+      distance_map = self.engine.get_player_distance_map()
+      if distance_map is not None:
+        # Walking downhill on the shared map is cheaper than a pathfinder of its own
+        rest = self.get_path_downhill(distance_map, before)
+        if not rest or cell in rest:
+          return False
+        self.path[step:] = rest
+        self._path_steps = {cell: i for i, cell in enumerate(self.path)}
+        return True
+    detour = self.get_path_between(before, self.path[step + 1])
+    if not detour or len(detour) > self.max_detour:
+      return False
+    self.path[step:step + 2] = detour
+    self._path_steps = {cell: i for i, cell in enumerate(self.path)}
+    return True
 
   def perform(self) -> None:
     target = self.engine.player
@@ -60,20 +164,29 @@ class HostileEnemy(BaseAI):
     distance = max(abs(dx), abs(dy)) # Dhebyshev distance
 
     if self.engine.game_map.visible[self.entity.x, self.entity.y]:
+      self.idle_turns = 0
       if distance <= 4:
         self.sleeping = False
       if distance <= 1:
         if dx == 0 or dy == 0: # Only attack in cardinal directions
-          return MeleeAction(self.entity, dx, dy).perform()
+          return self.act(MeleeAction(self.entity, dx, dy))
       if not self.sleeping or self.entity.fighter.did_take_damage:
         # Wake up if not sleeping, or if took damage
-        self.path = self.get_path_to(target.x, target.y)
+        goal = target.x, target.y
+        if not self.path_is_valid(goal):
+          self.set_path(self.get_path_to(*goal), goal)
 
-    if self.path:
-      dest_x, dest_y = self.path.pop(0)
-      return MovementAction(self.entity, dest_x - self.entity.x, dest_y - self.entity.y).perform()
+    if self.has_path:
+      dest_x, dest_y = self.path[self.path_index]
+      self.path_index += 1
+      if self.path_key is not None:
+        self.path_key = (dest_x, dest_y), *self.path_key[1:] # Where the path continues from
+      return self.act(MovementAction(self.entity, dest_x - self.entity.x, dest_y - self.entity.y))
 
-    return WaitAction(self.entity).perform()
+    self.idle_turns += 1
+    if self.sleep_after is not None and self.idle_turns >= self.sleep_after:
+      self.sleeping = True
+    return self.act(WaitAction(self.entity))
 
 
 class ConfusedEnemy(BaseAI):
@@ -87,7 +200,7 @@ class ConfusedEnemy(BaseAI):
       self.engine.message_log.add_message(f"The {self.entity.name} is no longer confused")
       self.entity.ai = self.previous_ai
     else:
-      x, y = random.choice(
+      x, y = self.engine.game_map.rng.choice(
         [
           (0, -1),
           (-1, 0),
@@ -96,4 +209,4 @@ class ConfusedEnemy(BaseAI):
         ]
       )
       self.turns_remaining -= 1
-      return BumpAction(self.entity, x, y).perform()
\ No newline at end of file
+      return self.act(BumpAction(self.entity, x, y))
\ No newline at end of file
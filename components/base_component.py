@@ -2,6 +2,8 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
+from prototypes import restore_slots
+
 if TYPE_CHECKING:
   from engine import Engine
   from entity import Entity
@@ -11,6 +13,11 @@ if TYPE_CHECKING:
 class BaseComponent:
   parent: Entity
 
+  __slots__ = ("parent",)
+
+  def __setstate__(self, state: object) -> None:
+    restore_slots(self, state) # Components from older saves were pickled with a __dict__
+
   @property
   def game_map(self) -> GameMap:
     return self.parent.game_map
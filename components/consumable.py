@@ -14,6 +14,7 @@ from input_handlers import (
   AreaRangedAttackHandler
 )
 from exceptions import Impossible
+import prototypes
 
 if TYPE_CHECKING:
   from entity import Actor, Item
@@ -22,6 +23,8 @@ if TYPE_CHECKING:
 class Consumable(BaseComponent):
   parent: Item
 
+  __slots__ = ()
+
   def get_action(self, consumer: Actor) -> Optional[ActionOrHandler]:
     return actions.ItemAction(consumer, self.parent)
 
@@ -33,9 +36,12 @@ class Consumable(BaseComponent):
     inventory = entity.parent   # items parent is the Inventory (or should be)
     if isinstance(inventory, Inventory):
       inventory.items.remove(entity) # remove the item from the inventory
+      prototypes.release(entity)
 
 
 class HealingConsumable(Consumable):
+  __slots__ = ("amount",)
+
   def __init__(self, amount: int):
     super().__init__()
     self.amount = amount
@@ -53,6 +59,8 @@ class HealingConsumable(Consumable):
       raise Impossible(f"You are already of perfect health")
 
 class LightningDamageConsumable(Consumable):
+  __slots__ = ("damage", "max_range")
+
   def __init__(self, damage: int, max_range: int) -> None:
     self.damage = damage
     self.max_range = max_range
@@ -80,6 +88,8 @@ class LightningDamageConsumable(Consumable):
 
 
 class ConfusionConsumable(Consumable):
+  __slots__ = ("number_of_turns",)
+
   def __init__(self, number_of_turns: int) -> None:
     self.number_of_turns = number_of_turns
 
@@ -106,10 +116,13 @@ class ConfusionConsumable(Consumable):
       colors.status_effect_applied
     )
     target.ai = ConfusedEnemy(entity=target, previous_ai=target.ai, turns_remaining=self.number_of_turns)
+    self.engine.game_map.activate(target) # A dormant target starts stumbling on the next enemy turn
     self.consume()
 
 
 class FireballDamageConsumable(Consumable):
+  __slots__ = ("damage", "radius")
+
   def __init__(self, damage: int, radius: int) -> None:
     self.damage = damage
     self.radius = radius
@@ -127,14 +140,21 @@ class FireballDamageConsumable(Consumable):
     if not self.engine.game_map.visible[target_xy]:
       raise Impossible("You cannot target an area that you cannot see")
 
+    game_map = self.engine.game_map
+    if game_map.entity_store is not None:
+      actors_hit = game_map.entity_store.actors_in_radius(*target_xy, self.radius)
+    else:
+      actors_hit = [
+        actor for actor in game_map.actors if actor.distance(*target_xy) <= self.radius
+      ]
+
     targets_hit = False
-    for actor in self.engine.game_map.actors:
-      if actor.distance(*target_xy) <= self.radius:
-        self.engine.message_log.add_message(
-          f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage"
-        )
-        actor.fighter.take_damage(self.damage)
-        targets_hit = True
+    for actor in actors_hit:
+      self.engine.message_log.add_message(
+        f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage"
+      )
+      actor.fighter.take_damage(self.damage)
+      targets_hit = True
 
     if not targets_hit:
       raise Impossible("There are no targets within the targeted area")
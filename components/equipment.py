@@ -11,6 +11,8 @@ if TYPE_CHECKING:
 class Equipment(BaseComponent):
   parent: Actor
 
+  __slots__ = ("weapon", "armor")
+
   def __init__(
     self, 
     weapon: Optional[Item] = None,
@@ -22,6 +22,8 @@ if TYPE_CHECKING:
 class Equippable(BaseComponent):
   parent: Item
 
+  __slots__ = ("equipment_type", "power_bonus", "defense_bonus", "durability")
+
   def __init__(
     self,
     equipment_type: EquipmentType,
@@ -36,6 +38,8 @@ class Equippable(BaseComponent):
 
 
 class RangedWeapon(Equippable):
+  __slots__ = ("range", "power")
+
   def __init__(
     self,
     range: int,
@@ -11,6 +11,8 @@ if TYPE_CHECKING:
 class Fighter(BaseComponent):
   parent: Actor
 
+  __slots__ = ("max_hp", "_hp", "base_defense", "base_power", "did_take_damage")
+
   def __init__(
     self,
     hp: int,
@@ -69,6 +71,7 @@ class Fighter(BaseComponent):
     self.parent.ai = None
     self.parent.name = f"remains of {self.parent.name}"
     self.parent.render_order = RenderOrder.CORPSE
+    self.game_map.refresh_entity(self.parent)
 
     self.engine.message_log.add_message(death_message, death_message_color)
 
@@ -85,3 +88,4 @@ class Fighter(BaseComponent):
   def take_damage(self, amount: int) -> None:
     self.hp -= amount
     self.did_take_damage = True
+    self.game_map.activate(self.parent) # Being hurt wakes an actor wherever it is
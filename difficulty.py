@@ -78,6 +78,7 @@ def get_random_entities_by_floor(
   weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]],
   number_of_entities: int,
   floor: int,
+  rng: random.Random,
 ) -> List[Entity]:
   entity_weighted_chances = {}
   for key, values in weighted_chances_by_floor.items():
@@ -92,7 +93,7 @@ def get_random_entities_by_floor(
   entities = list(entity_weighted_chances.keys())
   entity_weighted_chance_values = list(entity_weighted_chances.values())
 
-  chosen_entities = random.choices(
+  chosen_entities = rng.choices(
       entities, weights=entity_weighted_chance_values, k=number_of_entities
   )
 
@@ -1,47 +1,111 @@
 from __future__ import annotations
-from multiprocessing import Event
-import lzma
-import pickle
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
+import numpy as np # type: ignore
 from tcod.console import Console
-from tcod.map import compute_fov
+import tcod.path
 
 from message_log import MessageLog
+from profiler import Profiler
+import scheduler
+from scheduler import TURN
 import exceptions
 import render_functions
 
 if TYPE_CHECKING:
+  from autosave import AutoSaver
   from entity import Actor
   from game_map import GameMap, GameWorld
+  from journal import Journal
 
 
 class Engine:
   game_map: GameMap     # The current floors game map
   game_world: GameWorld # Generate GameMaps for each floor
+  wake_radius = 4       # Actors this close to the player are activated even when unseen
 
   def __init__(self, player: Actor):
     self.message_log = MessageLog()
     self.mouse_location = (0, 0)
     self.player = player
+    self._sharing_player_distance_map = False
+    self._player_distance_map: Optional[np.ndarray] = None
+    self.profiler = Profiler()
+    self.turn = 0 # Turns which have passed in this game
+    self.autosaver: Optional[AutoSaver] = None
+    self.journal: Optional[Journal] = None # Records the players actions for replays
 
-  def handle_enemy_turns(self) -> None:
-    for entity in set(self.game_map.actors) - {self.player}:
-      if entity.ai:
-        try:
-          entity.ai.perform()
-        except exceptions.Impossible:
-          pass # Ignore impossible action exceptions from AI
+  def __getstate__(self) -> dict:
+    state = self.__dict__.copy()
+    # Timings, the autosave thread and the journal file belong to the session, not the save
+    del state["profiler"], state["autosaver"], state["journal"]
+    # Where the journal was when saved, so a loaded game can resume it
+    state["journal_position"] = self.journal.position if self.journal else None
+    return state
+
+  def __setstate__(self, state: dict) -> None:
+    state.setdefault("turn", 0) # Missing from older saves
+    state.setdefault("journal_position", None)
+    state.setdefault("_sharing_player_distance_map", False)
+    state.setdefault("_player_distance_map", None)
+    self.__dict__.update(state)
+    self.profiler = Profiler()
+    self.autosaver = None
+    self.journal = None
+
+  def handle_enemy_turns(self, time: int = TURN) -> None:
+    """Let time pass after the players action, every actor whose turn comes up acts in order"""
+    # Every monster chasing the player this turn walks down the same distance map
+    self._sharing_player_distance_map = True
+    profiler = self.profiler
+    try:
+      with profiler.phase("enemy_turns"):
+        # Only active actors are scheduled, see GameMap.activate
+        game_map = self.game_map
+        game_map.activate_near(self.player.x, self.player.y, self.wake_radius)
+        for entity in game_map.scheduler.advance(time):
+          ai = entity.ai
+          if not ai or entity is self.player:
+            continue
+          ai.last_action_cost = TURN
+          try:
+            with profiler.phase("ai", type(ai).__name__):
+              ai.perform()
+          except exceptions.Impossible:
+            pass # Ignore impossible action exceptions from AI
+          # An actor is left unscheduled once it dies or becomes dormant
+          if entity.ai and not entity.ai.is_dormant:
+            game_map.scheduler.schedule(entity, scheduler.delay(entity, ai.last_action_cost))
+    finally:
+      self._sharing_player_distance_map = False
+      self._player_distance_map = None
+
+  def get_player_distance_map(self) -> Optional[np.ndarray]:
+    """Return the distance map rooted at the player for the current enemy turn.
+    It is built on first use and returns None outside of the enemy turn"""
+    if not self._sharing_player_distance_map:
+      return None
+    if self._player_distance_map is None:
+      distance = tcod.path.maxarray(
+        (self.game_map.width, self.game_map.height), dtype=np.int32, order="F"
+      )
+      distance[self.player.x, self.player.y] = 0
+      tcod.path.dijkstra2d(distance, self.game_map.get_path_cost(), 2, 0, out=distance)
+      self._player_distance_map = distance
+    return self._player_distance_map
+
+  def end_turn(self) -> None:
+    self.turn += 1
+    if self.autosaver:
+      self.autosaver.turn_ended(self)
 
   def update_fov(self) -> None:
-    # Recompute the visible area
-    self.game_map.visible[:] = compute_fov(
-      self.game_map.tiles["transparent"],
-      (self.player.x, self.player.y),
-      radius=8
-    )
-    self.game_map.expolored |= self.game_map.visible
+    # Recompute the visible area, cached by the game map while nothing changes
+    with self.profiler.phase("fov"):
+      self.game_map.update_fov(self.player.x, self.player.y, radius=8)
 
   def render(self, console: Console) -> None:
+    if self.autosaver:
+      self.autosaver.report(self)
     self.game_map.render(console)
     self.message_log.render(console, x=21, y=45, width=55, height=5)
 
@@ -65,8 +129,10 @@ class Engine:
       engine=self
     )
 
-  def save_as(self, filename: str) -> None:
-    """Save this engine instance as a compressed file"""
-    save_data = lzma.compress(pickle.dumps(self))
-    with open(filename, "wb") as f:
-      f.write(save_data)
\ No newline at end of file
+    if self.profiler.enabled and self.profiler.show_overlay:
+      self.profiler.render(console, x=40, y=1)
+
+  def save_as(self, filename: str, codec: Optional[str] = None) -> None:
+    """Save this engine instance to a file, see savefile for the format and codecs"""
+    import savefile
+    savefile.save(self, filename, codec or savefile.DEFAULT_CODEC)
\ No newline at end of file
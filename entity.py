@@ -1,8 +1,9 @@
 from __future__ import annotations
-import copy
 import math
 from typing import Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union
+from prototypes import restore_slots
 from render_order import RenderOrder
+from scheduler import NORMAL_SPEED
 
 if TYPE_CHECKING:
   from components.ai import BaseAI
@@ -23,6 +24,12 @@ class Entity:
 
   parent: Union[GameMap, Inventory] # The parent of an entity is either the GameMap or an Actors Inventory
 
+  __slots__ = (
+    "parent", "x", "y", "char", "color", "name", "blocks_movement", "render_order", "prototype"
+  )
+  # Slots added since older saves were written
+  _state_defaults = {"prototype": None}
+
   def __init__(
     self, 
     parent: Optional[GameMap] = None,
@@ -41,22 +48,27 @@ class Entity:
     self.name = name
     self.blocks_movement = blocks_movement
     self.render_order = render_order
+    self.prototype: Optional[str] = None # Name this entity was registered or spawned under
     if parent:
       # If parent isn't provided now it will be set later
       self.parent = parent
-      parent.entities.add(self)
+      parent.add_entity(self)
 
   @property
   def game_map(self) -> GameMap:
     return self.parent.game_map
 
+  def __setstate__(self, state: object) -> None:
+    restore_slots(self, state, self._state_defaults)
+
   def spawn(self: T, game_map: GameMap, x: int, y: int) -> T:
     # Spawn a copy of this instance at the given location
-    clone = copy.deepcopy(self)
+    import prototypes
+    clone = prototypes.instantiate(self)
     clone.x = x
     clone.y = y
     clone.parent = game_map
-    game_map.entities.add(clone)
+    game_map.add_entity(clone)
     return clone
 
   def place(self, x: int, y: int, game_map: Optional[GameMap] = None) -> None:
@@ -66,13 +78,16 @@ class Entity:
     if game_map:
       if hasattr(self, "parent"):
         if self.parent is self.game_map:
-          self.game_map.entities.remove(self)
+          self.game_map.remove_entity(self)
       self.parent = game_map
-      game_map.entities.add(self)
+      game_map.add_entity(self)
+    elif hasattr(self, "parent"):
+      self.game_map.relocate_entity(self)
 
   def move(self, dx: int, dy: int) -> None:
     self.x += dx
     self.y += dy
+    self.game_map.relocate_entity(self)
 
   def distance(self, x: int, y: int) -> float:
     # Return the distance between this entity and the given location
@@ -80,6 +95,9 @@ class Entity:
 
 
 class Actor(Entity):
+  __slots__ = ("ai", "fighter", "inventory", "equipment", "speed")
+  _state_defaults = {**Entity._state_defaults, "speed": NORMAL_SPEED}
+
   def __init__(
     self,
     *,
@@ -92,6 +110,7 @@ class Actor(Entity):
     equipment: Equipment,
     fighter: Fighter,
     inventory: Inventory,
+    speed: int = NORMAL_SPEED,
   ):
     super().__init__(
       x=x,
@@ -110,6 +129,7 @@ class Actor(Entity):
     self.inventory.parent = self
     self.equipment = equipment
     self.equipment.parent = self
+    self.speed = speed # Actions take NORMAL_SPEED / speed times as long
 
   @property
   def is_alive(self) -> bool:
@@ -117,6 +137,8 @@ class Actor(Entity):
 
 
 class Item(Entity):
+  __slots__ = ("consumable", "equippable")
+
   def __init__(
     self,
     *,
@@ -8,8 +8,9 @@ from components.inventory import Inventory
 from components.equipment import Equipment
 from entity import Actor, Item
 import equipment_types
+import prototypes
 
-player = Actor(
+player = prototypes.register("player", Actor(
   char="@", 
   color=(255, 255, 255), 
   name="Player", 
@@ -17,9 +18,9 @@ player = Actor(
   equipment=Equipment(),
   fighter=Fighter(hp=30, base_defense=2, base_power=4),
   inventory=Inventory(capacity=26)
-)
+))
 
-orc = Actor(
+orc = prototypes.register("orc", Actor(
   char="o", 
   color=(63, 127, 63), 
   name="Orc", 
@@ -27,9 +28,9 @@ orc = Actor(
   equipment=Equipment(),
   fighter=Fighter(hp=10, base_defense=0, base_power=4),
   inventory=Inventory(capacity=0)
-)
+))
 
-troll = Actor(
+troll = prototypes.register("troll", Actor(
   char="T", 
   color=(0, 127, 0), 
   name="Troll", 
@@ -37,53 +38,53 @@ troll = Actor(
   equipment=Equipment(),
   fighter=Fighter(hp=16, base_defense=2, base_power=6),
   inventory=Inventory(capacity=0)
-)
+))
 
 
 
-health_potion = Item(
+health_potion = prototypes.register("health_potion", Item(
   char="!",
   color=(127, 0, 255),
   name="Potion of Healing",
   consumable=consumable.HealingConsumable(amount=4)
-)
+))
 
-green_apple = Item(
+green_apple = prototypes.register("green_apple", Item(
   char=",",
   color=(32, 255, 32),
   name="Green apple",
   consumable=consumable.HealingConsumable(amount=2)
-)
+))
 
-red_apple = Item(
+red_apple = prototypes.register("red_apple", Item(
   char=",",
   color=(255, 32, 32),
   name="Red apple",
   consumable=consumable.HealingConsumable(amount=3)
-)
+))
 
-lightning_scroll = Item(
+lightning_scroll = prototypes.register("lightning_scroll", Item(
   char="~",
   color=(255, 255, 0),
   name="Scroll of Lightning",
   consumable=consumable.LightningDamageConsumable(damage=20, max_range=5)
-)
+))
 
-confusion_scroll = Item(
+confusion_scroll = prototypes.register("confusion_scroll", Item(
   char="~",
   color=(207, 63, 255),
   name="Scroll of Confusion",
   consumable=consumable.ConfusionConsumable(number_of_turns=10)
-)
+))
 
-fireball_scroll = Item(
+fireball_scroll = prototypes.register("fireball_scroll", Item(
   char="~",
   color=(255, 0, 0),
   name="Scroll of Conflagration",
   consumable=consumable.FireballDamageConsumable(damage=12, radius=3)
-)
+))
 
-bow = Item(
+bow = prototypes.register("bow", Item(
   char="}",
   color=(0, 191, 255),
   name="Long bow",
@@ -91,9 +92,9 @@ bow = Item(
     range=1,
     power=3,
   )
-)
+))
 
-dagger = Item(
+dagger = prototypes.register("dagger", Item(
   char="/",
   color=(0, 191, 255),
   name="Rusty dagger",
@@ -103,9 +104,9 @@ dagger = Item(
     defense_bonus=0,
     durability=20,
   )
-)
+))
 
-short_sword = Item(
+short_sword = prototypes.register("short_sword", Item(
   char="/",
   color=(0, 191, 255),
   name="Short sword",
@@ -115,10 +116,10 @@ short_sword = Item(
     defense_bonus=1,
     durability=20,
   )
-)
+))
 
 
-leather_armor = Item(
+leather_armor = prototypes.register("leather_armor", Item(
   char="[",
   color=(139, 69, 19),
   name="Leather armor",
@@ -128,9 +129,9 @@ leather_armor = Item(
     defense_bonus=1,
     durability=10,
   )
-)
+))
 
-chain_mail = Item(
+chain_mail = prototypes.register("chain_mail", Item(
   char="[",
   color=(139, 69, 19),
   name="Chain mail",
@@ -140,4 +141,4 @@ chain_mail = Item(
     defense_bonus=2,
     durability=20,
   )
-)
\ No newline at end of file
+))
\ No newline at end of file
@@ -0,0 +1,127 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+import numpy as np # type: ignore
+
+from entity import Actor
+
+if TYPE_CHECKING:
+  from entity import Entity
+
+
+class EntityStore:
+  """
+  Struct of arrays copy of the per-entity data needed by bulk queries.
+  Each entity on a GameMap owns one row, the columns are kept in sync by the
+  GameMap whenever an entity is added, removed, moved or changed.
+  """
+
+  def __init__(self, capacity: int = 64):
+    self.rows: Dict[Entity, int] = {}
+    self.entities: List[Optional[Entity]] = [None] * capacity
+    self.in_use = np.zeros(capacity, dtype=bool)
+    self.x = np.zeros(capacity, dtype=np.int32)
+    self.y = np.zeros(capacity, dtype=np.int32)
+    self.blocks_movement = np.zeros(capacity, dtype=bool)
+    self.is_actor = np.zeros(capacity, dtype=bool)
+    self.alive = np.zeros(capacity, dtype=bool)
+    self.render_order = np.zeros(capacity, dtype=np.int8)
+    self.char = np.zeros(capacity, dtype=np.int32)
+    self.color = np.zeros((capacity, 3), dtype=np.uint8)
+    self._free_rows: List[int] = list(range(capacity - 1, -1, -1))
+
+  def __len__(self) -> int:
+    return len(self.rows)
+
+  def _grow(self) -> None:
+    old_capacity = len(self.entities)
+    new_capacity = old_capacity * 2
+    for name in (
+      "in_use", "x", "y", "blocks_movement", "is_actor", "alive", "render_order", "char", "color"
+    ):
+      column = getattr(self, name)
+      grown = np.zeros((new_capacity,) + column.shape[1:], dtype=column.dtype)
+      grown[:old_capacity] = column
+      setattr(self, name, grown)
+    self.entities.extend([None] * old_capacity)
+    self._free_rows = list(range(new_capacity - 1, old_capacity - 1, -1)) + self._free_rows
+
+  def add(self, entity: Entity) -> None:
+    if entity in self.rows:
+      self.update(entity)
+      return
+    if not self._free_rows:
+      self._grow()
+    row = self._free_rows.pop()
+    self.rows[entity] = row
+    self.entities[row] = entity
+    self.in_use[row] = True
+    self.update(entity)
+
+  def remove(self, entity: Entity) -> None:
+    row = self.rows.pop(entity)
+    self.entities[row] = None
+    self.in_use[row] = False
+    self.blocks_movement[row] = False
+    self.alive[row] = False
+    self._free_rows.append(row)
+
+  def update(self, entity: Entity) -> None:
+    """Copy the current state of an entity into its row"""
+    row = self.rows[entity]
+    self.x[row] = entity.x
+    self.y[row] = entity.y
+    self.blocks_movement[row] = entity.blocks_movement
+    self.is_actor[row] = isinstance(entity, Actor)
+    self.alive[row] = isinstance(entity, Actor) and entity.is_alive
+    self.render_order[row] = entity.render_order.value
+    self.char[row] = ord(entity.char)
+    self.color[row] = entity.color
+
+  def check(self) -> None:
+    """Raise AssertionError if any row does not match its entity"""
+    if int(self.in_use.sum()) != len(self.rows):
+      raise AssertionError("Entity store has rows in use without an entity")
+    for entity, row in self.rows.items():
+      expected = (
+        entity.x, entity.y, entity.blocks_movement, entity.render_order.value, ord(entity.char)
+      )
+      actual = (
+        self.x[row], self.y[row], self.blocks_movement[row], self.render_order[row], self.char[row]
+      )
+      if expected != actual or tuple(self.color[row]) != tuple(entity.color):
+        raise AssertionError(f"Entity store row {row} is out of sync with {entity.name}")
+
+  def live_actors(self) -> List[Actor]:
+    return [self.entities[row] for row in np.flatnonzero(self.alive)]
+
+  def blocking_positions(self) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the x and y arrays of every entity which blocks movement"""
+    rows = self.blocks_movement
+    return self.x[rows], self.y[rows]
+
+  def actors_in_radius(self, x: int, y: int, radius: float) -> List[Actor]:
+    """Return the living actors within the euclidean radius of x, y"""
+    rows = np.flatnonzero(self.alive)
+    dx = self.x[rows] - x
+    dy = self.y[rows] - y
+    in_radius = rows[dx * dx + dy * dy <= radius * radius]
+    return [self.entities[row] for row in in_radius]
+
+  def draw(self, tiles: np.ndarray, visible: np.ndarray, bounds: Tuple[slice, slice]) -> None:
+    """Draw every entity inside bounds standing on a visible tile, higher render orders on top"""
+    rows = np.flatnonzero(self.in_use)
+    x_bounds, y_bounds = bounds
+    xs, ys = self.x[rows], self.y[rows]
+    rows = rows[
+      (xs >= x_bounds.start) & (xs < x_bounds.stop) & (ys >= y_bounds.start) & (ys < y_bounds.stop)
+    ]
+    rows = rows[visible[self.x[rows], self.y[rows]]]
+    if not len(rows):
+      return
+    rows = rows[np.argsort(self.render_order[rows], kind="stable")]
+    # Keep only the last drawn (topmost) entity on each tile
+    tile_ids = self.x[rows].astype(np.int64) * visible.shape[1] + self.y[rows]
+    _, last = np.unique(tile_ids[::-1], return_index=True)
+    rows = rows[::-1][last]
+    tiles["ch"][self.x[rows], self.y[rows]] = self.char[rows]
+    tiles["fg"][self.x[rows], self.y[rows]] = self.color[rows]
@@ -0,0 +1,198 @@
+"""
+Floor archives.
+
+Floors of seeded worlds generated ahead of time, so challenge runs load their
+floors instead of generating them. An archive holds any number of floors of
+any number of seeds, all generated with the same map settings.
+
+  python floor_archive.py challenge.floors --seeds 1 2 3 --floors 100
+
+Archives use the sectioned format of savefile.py. For each floor there is a
+"<seed>/<floor>/tiles" section holding its tile IDs and a "<seed>/<floor>"
+section with the rest of its FloorDescription as JSON.
+"""
+from __future__ import annotations
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import time
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np # type: ignore
+
+from game_map import FloorKey, GameWorld
+import procgen
+from procgen import FloorDescription
+import savefile
+import tile_types
+
+MAGIC = b"RGFLOOR1\n"
+
+# GameWorld settings the floors of an archive were generated with
+SETTINGS = ("map_width", "map_height", "max_rooms", "room_min_size", "room_max_size")
+
+
+def describe_floor(key: FloorKey) -> FloorDescription:
+  """Generate one floor of a seeded world exactly as GameWorld would"""
+  floor, seed, map_width, map_height, max_rooms, room_min_size, room_max_size = key
+  rng, np_rng = GameWorld.floor_random(seed, floor)
+  return procgen.describe_dungeon(
+    max_rooms, room_min_size, room_max_size, map_width, map_height, floor, rng, np_rng
+  )
+
+
+def _floor_sections(seed: int, floor: int, description: FloorDescription) -> savefile.Snapshot:
+  name = f"{seed}/{floor}"
+  tiles = description.tiles
+  metadata = {
+    "stairs_down_location": description.stairs_down_location,
+    "player_start_location": description.player_start_location,
+    "spawns": description.spawns,
+    "random_seed": description.random_seed,
+  }
+  return [
+    (
+      {"name": f"{name}/tiles", "dtype": tiles.dtype.str, "shape": list(tiles.shape)},
+      np.asfortranarray(tiles).tobytes(order="F"),
+    ),
+    ({"name": name}, json.dumps(metadata).encode("utf-8")),
+  ]
+
+
+def write(
+  filename: str,
+  floors: Iterable[Tuple[FloorKey, FloorDescription]],
+  codec: str = savefile.DEFAULT_CODEC,
+) -> None:
+  """Write generated floors to an archive, they must all share the same map settings"""
+  settings: Optional[List[int]] = None
+  seeds: Dict[int, List[int]] = {} # The floors stored for each seed
+  sections: savefile.Snapshot = []
+  for key, description in floors:
+    floor, seed, *floor_settings = key
+    if settings is None:
+      settings = floor_settings
+    elif floor_settings != settings:
+      raise ValueError(f"Floor {floor} of seed {seed} was generated with other map settings")
+    seeds.setdefault(seed, []).append(floor)
+    sections.extend(_floor_sections(seed, floor, description))
+  index = {"settings": dict(zip(SETTINGS, settings or [])), "seeds": seeds}
+  sections.insert(0, ({"name": "index"}, json.dumps(index).encode("utf-8")))
+  savefile.write(sections, filename, codec, magic=MAGIC)
+
+
+class FloorArchive:
+  """Loads floors from an archive, the file is only opened once a floor is looked up"""
+
+  def __init__(self, filename: str):
+    self.filename = filename
+    self._file: Optional[BinaryIO] = None
+    self._reader: Optional[savefile.SectionReader] = None
+    self._settings: Dict[str, int] = {}
+    self._floors: Set[Tuple[int, int]] = set() # (seed, floor) of every stored floor
+
+  def __getstate__(self) -> dict:
+    # Only the filename is saved, the file is opened again when needed
+    return {"filename": self.filename}
+
+  def __setstate__(self, state: dict) -> None:
+    self.__init__(state["filename"])
+
+  def _open(self) -> savefile.SectionReader:
+    if self._reader is None:
+      self._file = open(self.filename, "rb")
+      if self._file.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{self.filename} is not a floor archive")
+      self._reader = savefile.SectionReader(self._file, magic=MAGIC)
+      index = json.loads(self._reader.read("index"))
+      self._settings = index["settings"]
+      self._floors = {
+        (int(seed), floor) for seed, floors in index["seeds"].items() for floor in floors
+      }
+    return self._reader
+
+  def __contains__(self, key: FloorKey) -> bool:
+    self._open()
+    floor, seed, *settings = key
+    # An archive written without floors has no settings either
+    return (seed, floor) in self._floors and settings == [self._settings.get(name) for name in SETTINGS]
+
+  def describe(self, key: FloorKey) -> Optional[FloorDescription]:
+    """Return the stored floor for this key, None if it isn't in the archive"""
+    if key not in self:
+      return None
+    reader = self._open()
+    floor, seed = key[:2]
+    name = f"{seed}/{floor}"
+    info = reader.infos[f"{name}/tiles"]
+    tiles = np.frombuffer(reader.read(f"{name}/tiles"), dtype=tile_types.tile_id_dt)
+    tiles = tiles.reshape(info["shape"], order="F").copy(order="F")
+    metadata: Dict[str, Any] = json.loads(reader.read(name))
+    return FloorDescription(
+      tiles,
+      stairs_down_location=tuple(metadata["stairs_down_location"]),
+      player_start_location=tuple(metadata["player_start_location"]),
+      spawns=[(prototype, x, y) for prototype, x, y in metadata["spawns"]],
+      random_seed=metadata["random_seed"],
+    )
+
+  def close(self) -> None:
+    if self._file is not None:
+      self._file.close()
+    self._file = self._reader = None
+
+
+def generate(
+  seeds: Iterable[int],
+  floors: int,
+  map_width: int = 80,
+  map_height: int = 43,
+  max_rooms: int = 30,
+  room_min_size: int = 6,
+  room_max_size: int = 10,
+  workers: Optional[int] = None,
+) -> List[Tuple[FloorKey, FloorDescription]]:
+  """Generate floors 1 to floors of every seed across a pool of processes"""
+  keys: List[FloorKey] = [
+    (floor, seed, map_width, map_height, max_rooms, room_min_size, room_max_size)
+    for seed in seeds
+    for floor in range(1, floors + 1)
+  ]
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    return list(zip(keys, executor.map(describe_floor, keys, chunksize=16)))
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Generate the floors of seeded worlds into an archive.")
+  parser.add_argument("archive", help="archive file to write")
+  parser.add_argument("--seeds", type=int, nargs="+", required=True, help="world seeds to generate")
+  parser.add_argument("--floors", type=int, default=50, help="floors to generate for each seed")
+  parser.add_argument("--workers", type=int, default=None, help="processes to use, all CPUs by default")
+  parser.add_argument("--codec", choices=sorted(savefile.CODECS), default=savefile.DEFAULT_CODEC)
+  # The same defaults as setup_game.new_game
+  parser.add_argument("--width", type=int, default=80)
+  parser.add_argument("--height", type=int, default=43)
+  parser.add_argument("--max-rooms", type=int, default=30)
+  parser.add_argument("--room-min-size", type=int, default=6)
+  parser.add_argument("--room-max-size", type=int, default=10)
+  args = parser.parse_args()
+
+  start = time.perf_counter()
+  floors = generate(
+    args.seeds,
+    args.floors,
+    map_width=args.width,
+    map_height=args.height,
+    max_rooms=args.max_rooms,
+    room_min_size=args.room_min_size,
+    room_max_size=args.room_max_size,
+    workers=args.workers,
+  )
+  generated = time.perf_counter()
+  write(args.archive, floors, args.codec)
+  print(f"generated {len(floors)} floors in {generated - start:.3f}s, "
+        f"written in {time.perf_counter() - generated:.3f}s")
+
+
+if __name__ == "__main__":
+  main()
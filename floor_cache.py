@@ -0,0 +1,143 @@
+from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import itertools
+import os
+import shutil
+import tempfile
+from typing import Any, Callable, Dict, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+  from engine import Engine
+  from game_map import GameMap
+
+_link_numbers = itertools.count()
+
+
+class FloorCache:
+  """
+  Keeps the floors the player has left so they can be returned to.
+  Every floor put in the cache is written once to a compressed snapshot on
+  disk, on a worker thread so leaving a floor never waits for the disk.
+  Floors also stay in memory until their estimated size goes over budget,
+  then the least recently left ones are dropped and loaded from their
+  snapshots when they are taken back.
+  """
+
+  def __init__(self, budget: int = 64 * 2**20, directory: Optional[str] = None):
+    self.budget = budget # Bytes of floors to keep in memory
+    self.directory = directory # Where snapshots are written, a temporary directory if None
+    self.hits = 0      # Floors taken from memory
+    self.misses = 0    # Floors loaded back from disk
+    self.evictions = 0 # Floors dropped from memory
+    self._maps: OrderedDict[int, GameMap] = OrderedDict() # Least recently used first
+    self._sizes: Dict[int, int] = {}
+    self._files: Dict[int, str] = {} # Snapshot filename of every floor in the cache
+    self._writes: Dict[int, Future] = {} # Snapshots which may still be being written
+    self._executor: Optional[ThreadPoolExecutor] = None
+    self._temporary_directory: Optional[tempfile.TemporaryDirectory] = None
+
+  def __contains__(self, floor: int) -> bool:
+    return floor in self._files
+
+  def __len__(self) -> int:
+    return len(self._files)
+
+  @property
+  def memory_usage(self) -> int:
+    """Estimated bytes used by the floors held in memory"""
+    return sum(self._sizes.values())
+
+  def stats(self) -> Dict[str, int]:
+    return {
+      "hits": self.hits,
+      "misses": self.misses,
+      "evictions": self.evictions,
+      "in_memory": len(self._maps),
+      "on_disk": len(self._files) - len(self._maps),
+      "memory_usage": self.memory_usage,
+    }
+
+  def put(self, floor: int, game_map: GameMap) -> None:
+    """Keep a floor the player has just left"""
+    game_map.drop_caches()
+    filename = self._filename(floor)
+    # A floor nobody plays on doesn't change, so it is safe to snapshot in the background
+    self._writes[floor] = self._submit(self._write, game_map, filename)
+    self._files[floor] = filename
+    self._maps[floor] = game_map
+    self._sizes[floor] = game_map.memory_usage()
+    while self.memory_usage > self.budget and self._maps:
+      floor, _ = self._maps.popitem(last=False)
+      del self._sizes[floor]
+      self.evictions += 1
+
+  def take(self, floor: int, engine: Engine) -> Optional[GameMap]:
+    """Remove a floor from the cache and return it, None if it was never put"""
+    filename = self._files.pop(floor, None)
+    if filename is None:
+      return None
+    write = self._writes.pop(floor, None)
+    if write is not None:
+      write.result() # The floor mustn't change while it is pickled
+    game_map = self._maps.pop(floor, None)
+    if game_map is not None:
+      del self._sizes[floor]
+      self.hits += 1
+    else:
+      import savefile
+      game_map = savefile.load_map(filename, engine)
+      self.misses += 1
+    self._submit(os.remove, filename) # After any save linking it
+    return game_map
+
+  def link_files(self) -> Dict[int, Future]:
+    """Link the snapshot of every floor in the cache for a save to read later.
+    Returns futures of the link filenames, they resolve on the worker once the snapshots
+    are written. The links stay readable after their floors are taken back,
+    whoever reads them removes them"""
+    return {floor: self._submit(self._link, filename) for floor, filename in self._files.items()}
+
+  def restore(self, floor: int, data: bytes) -> None:
+    """Add a floor from the contents of its snapshot file, as read from a save"""
+    filename = self._filename(floor)
+    with open(filename, "wb") as f:
+      f.write(data)
+    self._files[floor] = filename
+
+  def _submit(self, function: Callable[..., Any], *args: Any) -> Future:
+    # One worker, so jobs on the same file run in the order they were submitted
+    if self._executor is None:
+      self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="floor-cache")
+    return self._executor.submit(function, *args)
+
+  @staticmethod
+  def _write(game_map: GameMap, filename: str) -> None:
+    import savefile
+    savefile.write(savefile.snapshot_map(game_map), filename)
+
+  @staticmethod
+  def _link(filename: str) -> str:
+    link = f"{filename}.{next(_link_numbers)}"
+    try:
+      os.link(filename, link)
+    except OSError: # No hard links on this file system
+      shutil.copyfile(filename, link)
+    return link
+
+  def _filename(self, floor: int) -> str:
+    directory = self.directory
+    if directory is None:
+      if self._temporary_directory is None:
+        self._temporary_directory = tempfile.TemporaryDirectory(prefix="rogue-floors-")
+      directory = self._temporary_directory.name
+    return os.path.join(directory, f"floor-{os.getpid()}-{id(self)}-{floor}.sav")
+
+  def __getstate__(self) -> dict:
+    state = self.__dict__.copy()
+    # The snapshot files belong to this session, savefile.snapshot saves them as
+    # sections of their own and load restores them
+    state.update(
+      _maps=OrderedDict(), _sizes={}, _files={}, _writes={}, _executor=None, _temporary_directory=None
+    )
+    return state
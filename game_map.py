@@ -1,34 +1,179 @@
 from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from optparse import Option
-from typing import Iterable, Iterator, List, Optional, TYPE_CHECKING
+import itertools
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union, TYPE_CHECKING
+import random
+import tempfile
+import traceback
 import numpy as np # type: ignore
 from tcod.console import Console
+from tcod.map import compute_fov
 
+from bitmask import BitMask
 from entity import Actor, Item
+from entity_store import EntityStore
+from floor_cache import FloorCache
+from scheduler import Scheduler
 import tile_types
 import entity_factories
 
 if TYPE_CHECKING:
   from engine import Engine
   from entity import Entity
+  from floor_archive import FloorArchive
+
+# Rough bytes used by an entity and its components, see benchmarks/memory.py
+ENTITY_BYTES = 512
+
+# Added to the path cost of a tile for each entity blocking it
+# A lower number means more enemies will crowd behind each other,
+# a higher number means enemies will take longer paths in order
+# to surround the player
+BLOCKER_COST = 10
+
+# Blocker changes kept for repairing cached paths, older ones force a full recompute
+BLOCKER_LOG_LENGTH = 256
+
+# A blocking entity moving from one location to another, None when it appeared or stopped blocking
+BlockerChange = Tuple[int, "Entity", Optional[Tuple[int, int]], Optional[Tuple[int, int]]]
+
+# (floor, seed, map_width, map_height, max_rooms, room_min_size, room_max_size)
+FloorKey = Tuple[int, int, int, int, int, int, int]
 
 class GameMap:
-  def __init__(self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()):
+  # When True the spatial index is fully verified after every update, used by tests
+  validate_spatial_index = False
+
+  def __init__(
+    self,
+    engine: Engine,
+    width: int,
+    height: int,
+    entities: Iterable[Entity] = (),
+    use_entity_store: bool = True,
+    memmap_dir: Optional[str] = None,
+    packed_masks: bool = False,
+  ):
     self.engine = engine
     self.width, self.height = width, height
-    self.entities = set(entities)
-    self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
-    self.visible = np.full((width, height), fill_value=False, order="F")
-    self.expolored = np.full((width, height), fill_value=False, order="F")
+    # Entities should only be added or removed through add_entity/remove_entity
+    # so the spatial index stays in sync
+    # Used as an ordered set, iteration follows insertion so games replay the same
+    self.entities: Dict[Entity, None] = {}
+    self._entities_by_location: Dict[Tuple[int, int], List[Entity]] = {}
+    self._entity_locations: Dict[Entity, Tuple[int, int]] = {}
+    # Optional array copy of the entities for vectorized queries
+    self.entity_store: Optional[EntityStore] = EntityStore() if use_entity_store else None
+    # Bumped whenever a blocking entity moves, appears or stops blocking, cached paths compare against it
+    self.blocker_version = 0
+    self._clear_blocker_log()
+    # Very large maps can keep their tile layers in files in memmap_dir instead of in memory
+    self.memmap_dir = memmap_dir
+    # Tile IDs, see tile_types.palette for the properties of each
+    self.tiles = self._new_layer(tile_types.wall, tile_types.tile_id_dt)
+    # Packed masks store visible and explored with one bit per tile
+    self.visible = self._new_mask(packed_masks)
+    self.expolored = self._new_mask(packed_masks)
     self.stairs_down_location = (0, 0)
+    self.player_start_location = (0, 0)
+    # Random streams for this floor, generate_dungeon replaces these with seeded ones
+    self.rng = random.Random()
+    self.np_rng = np.random.default_rng()
+    # Bumped whenever tiles changes, anything derived from tiles compares against it
+    self.tiles_version = 0
+    self._fov_key: Optional[Tuple[int, int, int, int]] = None
+    self._fov_bounds: Optional[Tuple[slice, slice]] = None
+    # Orders the turns of the active actors, the rest are dormant and cost nothing
+    self.scheduler = Scheduler()
+    self._clear_tile_property_cache()
+    self._clear_render_cache()
+    for entity in entities:
+      self.add_entity(entity)
+
+  def __getstate__(self) -> dict:
+    state = self.__dict__.copy()
+    # The render cache is rebuilt on the first frame, don't save it
+    for key in ("_tile_layer", "_frame", "_frame_tiles_version", "_dirty_regions", "_dirty_tiles"):
+      del state[key]
+    del state["_tile_properties"], state["_tile_properties_version"]
+    del state["_blocker_locations"], state["_blocker_changes"]
+    del state["_path_cost"], state["_path_cost_view"], state["_path_cost_version"]
+    state.pop("_unindexed_entities", None)
+    return state
+
+  def __setstate__(self, state: dict) -> None:
+    if not isinstance(state["entities"], dict):
+      state["entities"] = dict.fromkeys(state["entities"]) # Saved as a set
+    if "scheduler" not in state:
+      # Older saves ran every actor each turn
+      state["scheduler"] = Scheduler()
+      for actor in state["entities"]:
+        if isinstance(actor, Actor):
+          state["scheduler"].schedule(actor)
+    state.setdefault("blocker_version", 0)
+    # Missing from saves written before the spatial index and seeded floors
+    unindexed: List[Entity] = []
+    if "_entity_locations" not in state:
+      unindexed = list(state["entities"])
+      state.update(entities={}, _entities_by_location={}, _entity_locations={}, entity_store=None)
+    state.setdefault("memmap_dir", None)
+    state.setdefault("player_start_location", (0, 0))
+    state.setdefault("rng", random.Random())
+    state.setdefault("np_rng", np.random.default_rng())
+    state.setdefault("tiles_version", 0)
+    state.setdefault("_fov_key", None)
+    state.setdefault("_fov_bounds", None)
+    self.__dict__.update(state)
+    # Indexed by index_entities once the entities themselves are unpickled
+    self._unindexed_entities = unindexed
+    self._clear_blocker_log()
+    if self.tiles.dtype != tile_types.tile_id_dt:
+      self.tiles = tile_types.ids_from_records(self.tiles) # Saved before tile IDs
+    self._clear_tile_property_cache()
+    self._clear_render_cache()
 
   @property
   def game_map(self) -> GameMap:
     return self
 
+  def index_entities(self) -> None:
+    """Add the entities of a map loaded from a save without a spatial index"""
+    unindexed, self._unindexed_entities = getattr(self, "_unindexed_entities", []), []
+    if unindexed and self.entity_store is None:
+      self.entity_store = EntityStore()
+    for entity in unindexed:
+      self.add_entity(entity)
+
+  def _new_layer(
+    self, fill_value: object, dtype: np.dtype, shape: Optional[Tuple[int, int]] = None
+  ) -> np.ndarray:
+    """Return an array filled with fill_value, memory mapped if memmap_dir is set.
+    The shape defaults to the size of the map"""
+    if shape is None:
+      shape = (self.width, self.height)
+    if self.memmap_dir is None:
+      return np.full(shape, fill_value=fill_value, dtype=dtype, order="F")
+    # The file is anonymous, it's deleted as soon as the map no longer uses it
+    layer = np.memmap(
+      tempfile.TemporaryFile(dir=self.memmap_dir), dtype=dtype, mode="w+", shape=shape, order="F"
+    )
+    layer[...] = fill_value
+    return layer
+
+  def _new_mask(self, packed: bool) -> Union[np.ndarray, BitMask]:
+    if not packed:
+      return self._new_layer(False, np.bool)
+    bits = self._new_layer(0, np.uint8, (self.width, (self.height + 7) // 8))
+    return BitMask((self.width, self.height), bits)
+
   @property
   def actors(self) -> Iterator[Actor]:
     """Iterate over this maps living actors"""
+    if self.entity_store is not None:
+      yield from self.entity_store.live_actors()
+      return
     yield from (
       entity
       for entity in self.entities
@@ -42,15 +187,185 @@ class GameMap:
       entity for entity in self.entities if isinstance(entity, Item)
     )
 
+  def add_entity(self, entity: Entity) -> None:
+    """Add an entity to this map and index it at its current location"""
+    if entity in self._entity_locations:
+      self._unindex(entity)
+    self.entities[entity] = None
+    self._index(entity)
+    if self.entity_store is not None:
+      self.entity_store.add(entity)
+    self._update_blocker(entity)
+    if isinstance(entity, Actor) and self.visible[entity.x, entity.y]:
+      self.activate(entity) # Spawned in view, it won't wait for the next FOV update
+    if self.validate_spatial_index:
+      self.check_spatial_index()
+
+  def activate(self, actor: Actor) -> None:
+    """Run this actors AI on enemy turns until it reports itself dormant"""
+    if actor.ai is not None and actor not in self.scheduler:
+      self.scheduler.schedule(actor)
+
+  def activate_visible(self, bounds: Tuple[slice, slice]) -> None:
+    """Activate every actor standing on a visible tile inside bounds"""
+    xs, ys = np.nonzero(self.visible[bounds])
+    xs += bounds[0].start
+    ys += bounds[1].start
+    entities_by_location = self._entities_by_location
+    for location in zip(xs.tolist(), ys.tolist()):
+      for entity in entities_by_location.get(location, ()):
+        if isinstance(entity, Actor):
+          self.activate(entity)
+
+  def activate_near(self, x: int, y: int, radius: int) -> None:
+    """Activate every living actor within radius of x, y, seen or not"""
+    if radius <= 0:
+      return
+    if self.entity_store is not None:
+      actors: Iterable[Actor] = self.entity_store.actors_in_radius(x, y, radius)
+    else:
+      actors = (
+        actor for actor in self.actors
+        if (actor.x - x) ** 2 + (actor.y - y) ** 2 <= radius * radius
+      )
+    for actor in actors:
+      self.activate(actor)
+
+  def remove_entity(self, entity: Entity) -> None:
+    """Remove an entity from this map"""
+    del self.entities[entity]
+    self.scheduler.unschedule(entity)
+    self._unindex(entity)
+    if self.entity_store is not None:
+      self.entity_store.remove(entity)
+    self._update_blocker(entity)
+    if self.validate_spatial_index:
+      self.check_spatial_index()
+
+  def relocate_entity(self, entity: Entity) -> None:
+    """Update the spatial index after an entities x, y has changed"""
+    if entity not in self._entity_locations:
+      return # Not on this map, e.g. an item held in an inventory
+    self._unindex(entity)
+    self._index(entity)
+    if self.entity_store is not None:
+      self.entity_store.update(entity)
+    self._update_blocker(entity)
+    if self.validate_spatial_index:
+      self.check_spatial_index()
+
+  def refresh_entity(self, entity: Entity) -> None:
+    """Update the entity store after an entity changed how it looks or blocks"""
+    if entity not in self._entity_locations:
+      return
+    if self.entity_store is not None:
+      self.entity_store.update(entity)
+    self._update_blocker(entity)
+    if self._frame is not None:
+      self._dirty_tiles.add(self._entity_locations[entity])
+
+  def _clear_blocker_log(self) -> None:
+    # Where each blocking entity on the map stands, found on first use since
+    # entities may not be unpickled yet when the map is
+    self._blocker_locations: Optional[Dict[Entity, Tuple[int, int]]] = None
+    self._blocker_changes: Deque[BlockerChange] = deque(maxlen=BLOCKER_LOG_LENGTH)
+    # Built by get_path_cost from the blocker locations, then updated along with them
+    self._path_cost: Optional[np.ndarray] = None
+    self._path_cost_view: Optional[np.ndarray] = None
+    self._path_cost_version = -1
+
+  def _find_blockers(self, unknown: Optional[Entity] = None) -> Dict[Entity, Tuple[int, int]]:
+    return {
+      entity: location
+      for entity, location in self._entity_locations.items()
+      if entity is not unknown and entity.blocks_movement
+    }
+
+  def _update_blocker(self, entity: Entity) -> None:
+    """Bump blocker_version if the entity moved, appeared or stopped as a blocker.
+    Every add, remove, move, place and death goes through here"""
+    if self._blocker_locations is None:
+      # Where the entity was is unknown, the path cost isn't built yet either
+      self._blocker_locations = self._find_blockers(unknown=entity)
+    old = self._blocker_locations.get(entity)
+    new = self._entity_locations.get(entity) if entity.blocks_movement else None
+    if old == new:
+      return
+    if new is None:
+      del self._blocker_locations[entity]
+    else:
+      self._blocker_locations[entity] = new
+    cost = self._path_cost
+    if cost is not None:
+      # Walls stay at zero
+      if old is not None and cost[old]:
+        cost[old] -= BLOCKER_COST
+      if new is not None and cost[new]:
+        cost[new] += BLOCKER_COST
+    self.blocker_version += 1
+    self._blocker_changes.append((self.blocker_version, entity, old, new))
+
+  def blocker_changes_since(self, version: int) -> Optional[List[BlockerChange]]:
+    """Return the blocker changes made after version, None if they are no longer known"""
+    if version == self.blocker_version:
+      return []
+    changes = self._blocker_changes
+    if not changes or not changes[0][0] <= version + 1 <= self.blocker_version:
+      return None
+    # Versions in the log are consecutive so the first change after version is found directly
+    return list(itertools.islice(changes, version + 1 - changes[0][0], None))
+
+  def _index(self, entity: Entity) -> None:
+    location = entity.x, entity.y
+    self._entity_locations[entity] = location
+    self._entities_by_location.setdefault(location, []).append(entity)
+    if self._frame is not None:
+      self._dirty_tiles.add(location)
+
+  def _unindex(self, entity: Entity) -> None:
+    location = self._entity_locations.pop(entity)
+    if self._frame is not None:
+      self._dirty_tiles.add(location)
+    entities_here = self._entities_by_location[location]
+    entities_here.remove(entity)
+    if not entities_here:
+      del self._entities_by_location[location]
+
+  def check_spatial_index(self) -> None:
+    """Raise AssertionError if the spatial index is out of sync with the entities"""
+    if set(self._entity_locations) != set(self.entities):
+      raise AssertionError("Spatial index does not contain the same entities as the map")
+    indexed = 0
+    for location, entities_here in self._entities_by_location.items():
+      if not entities_here:
+        raise AssertionError(f"Empty spatial index bucket at {location}")
+      for entity in entities_here:
+        if (entity.x, entity.y) != location or self._entity_locations[entity] != location:
+          raise AssertionError(
+            f"{entity.name} is indexed at {location} but is at {(entity.x, entity.y)}"
+          )
+      indexed += len(entities_here)
+    if indexed != len(self.entities):
+      raise AssertionError("Spatial index contains duplicate entries")
+    if self.entity_store is not None:
+      if set(self.entity_store.rows) != set(self.entities):
+        raise AssertionError("Entity store does not contain the same entities as the map")
+      self.entity_store.check()
+
+  def get_entities_at_location(self, x: int, y: int) -> Tuple[Entity, ...]:
+    """Return every entity on this tile"""
+    return tuple(self._entities_by_location.get((x, y), ()))
+
   def get_blocking_entity_at_location(self, x: int, y: int) -> Optional[Entity]:
-    for entity in self.entities:
-      if entity.blocks_movement and entity.x == x and entity.y == y:
+    for entity in self._entities_by_location.get((x, y), ()):
+      if entity.blocks_movement:
         return entity
+    return None
 
   def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
-    for actor in self.actors:
-      if actor.x == x and actor.y == y:
-        return actor
+    for entity in self._entities_by_location.get((x, y), ()):
+      if isinstance(entity, Actor) and entity.is_alive:
+        return entity
     return None
 
   def get_closest_actor_in_range(self, range: int) -> Optional[Actor]:
@@ -66,24 +381,192 @@ class GameMap:
           closest_distance = distance
     return closest
 
+  def memory_usage(self) -> int:
+    """Estimate the bytes used by this map, its layers, caches and entities"""
+    arrays = [
+      self.tiles,
+      self.visible,
+      self.expolored,
+      self._tile_layer,
+      self._frame,
+      self._path_cost,
+      *self._tile_properties.values(),
+    ]
+    if self.entity_store is not None:
+      arrays.extend(vars(self.entity_store).values())
+    size = sum(array.nbytes for array in arrays if isinstance(array, (np.ndarray, BitMask)))
+    return size + len(self.entities) * ENTITY_BYTES
+
+  def drop_caches(self) -> None:
+    """Free everything which is rebuilt on demand, for floors which aren't being played"""
+    self._clear_tile_property_cache()
+    self._clear_render_cache()
+    self._path_cost = self._path_cost_view = None
+
+  @property
+  def walkable(self) -> np.ndarray:
+    """Read only mask of the walkable tiles"""
+    return self._tile_property("walkable")
+
+  @property
+  def transparent(self) -> np.ndarray:
+    """Read only mask of the tiles which don't block FOV"""
+    return self._tile_property("transparent")
+
+  def _tile_property(self, name: str) -> np.ndarray:
+    # Looked up from the palette once and then cached until tiles change
+    if self._tile_properties_version != self.tiles_version:
+      self._clear_tile_property_cache()
+    mask = self._tile_properties.get(name)
+    if mask is None:
+      # Indexing with the transpose keeps the result in Fortran order
+      mask = tile_types.palette[name][self.tiles.T].T
+      mask.flags.writeable = False
+      self._tile_properties[name] = mask
+    return mask
+
+  def _clear_tile_property_cache(self) -> None:
+    self._tile_properties: Dict[str, np.ndarray] = {}
+    self._tile_properties_version = self.tiles_version
+
+  def mark_tiles_changed(self) -> None:
+    """Must be called after tiles is modified so cached FOV and costs are rebuilt"""
+    self.tiles_version += 1
+
+  def update_fov(self, x: int, y: int, radius: int) -> None:
+    """Recompute the area visible from x, y. Nothing is done if the position,
+    radius and tiles are unchanged since the last call"""
+    key = (x, y, radius, self.tiles_version)
+    if key == self._fov_key:
+      return
+    self._fov_key = key
+
+    # Only the area last seen can be visible, clear that instead of the whole map
+    if self._fov_bounds is None:
+      self.visible[:] = False
+      self._clear_render_cache()
+    else:
+      self.visible[self._fov_bounds] = False
+      self._mark_region_dirty(self._fov_bounds)
+
+    if radius > 0:
+      # Nothing outside of the radius can be seen so clip FOV to its bounding box
+      left, top = max(0, x - radius), max(0, y - radius)
+      bounds = (
+        slice(left, min(self.width, x + radius + 1)),
+        slice(top, min(self.height, y + radius + 1)),
+      )
+    else:
+      left, top = 0, 0
+      bounds = (slice(0, self.width), slice(0, self.height))
+
+    self.visible[bounds] = compute_fov(
+      self.transparent[bounds], (x - left, y - top), radius=radius
+    )
+    self.expolored[bounds] |= self.visible[bounds]
+    self._fov_bounds = bounds
+    self._mark_region_dirty(bounds)
+    self.activate_visible(bounds)
+
+  def get_path_cost(self) -> np.ndarray:
+    """Return a pathfinding cost array, walls are 0 and blocking entities are expensive.
+    The array is kept up to date as blockers move and is shared, so it's read-only"""
+    if self._path_cost is None or self._path_cost_version != self.tiles_version:
+      self._path_cost_version = self.tiles_version
+      # Copy the walkable array
+      cost = np.array(self.walkable, dtype=np.int8)
+      if self._blocker_locations is None:
+        self._blocker_locations = self._find_blockers()
+      if self._blocker_locations:
+        xs, ys = np.array(list(self._blocker_locations.values())).T
+        # Only add cost where the tile is walkable, walls must stay at zero
+        walkable = cost[xs, ys] != 0
+        np.add.at(cost, (xs[walkable], ys[walkable]), BLOCKER_COST)
+      self._path_cost = cost
+      self._path_cost_view = cost.view()
+      self._path_cost_view.flags.writeable = False
+    return self._path_cost_view
+
   def in_bounds(self, x: int, y: int) -> bool:
     return 0 <= x < self.width and 0 <= y < self.height
 
-  def render(self, console: Console) -> None:
-    console.tiles_rgb[0:self.width, 0:self.height] = np.select(
-      condlist=[self.visible, self.expolored],
-      choicelist=[self.tiles["light"], self.tiles["dark"]],
-      default=tile_types.fog
-    )
+  def _clear_render_cache(self) -> None:
+    """Drop the cached frame so the next render redraws the whole map"""
+    self._tile_layer: Optional[np.ndarray] = None # Tile graphics without entities
+    self._frame: Optional[np.ndarray] = None      # Tile graphics with entities drawn on top
+    self._frame_tiles_version = -1
+    self._dirty_regions: List[Tuple[slice, slice]] = []
+    self._dirty_tiles: Set[Tuple[int, int]] = set()
+
+  def _mark_region_dirty(self, bounds: Tuple[slice, slice]) -> None:
+    if self._frame is None:
+      return # Everything will be redrawn anyway
+    self._dirty_regions.append(bounds)
+    if len(self._dirty_regions) > 8:
+      # Many turns passed without a render, a full redraw is cheaper than catching up
+      self._clear_render_cache()
 
+  def _compose_tiles(self, bounds: Tuple[slice, slice]) -> np.ndarray:
+    return tile_types.graphics[
+      self.tiles[bounds], tile_types.graphics_index(self.visible[bounds], self.expolored[bounds])
+    ]
+
+  def _draw_entities(self, bounds: Tuple[slice, slice]) -> None:
+    """Draw the entities inside bounds which are in FOV onto the cached frame"""
+    if self.entity_store is not None:
+      self.entity_store.draw(self._frame, self.visible, bounds)
+      return
+
+    x_range = range(self.width)[bounds[0]]
+    y_range = range(self.height)[bounds[1]]
     entities_sorted_for_rendering = sorted(
       self.entities, key=lambda x: x.render_order.value
     )
 
     for entity in entities_sorted_for_rendering:
       # Only print entities that are in FOV
-      if self.visible[entity.x, entity.y]:
-        console.print(x=entity.x, y=entity.y, string=entity.char, fg=entity.color)
+      if entity.x in x_range and entity.y in y_range and self.visible[entity.x, entity.y]:
+        self._frame["ch"][entity.x, entity.y] = ord(entity.char)
+        self._frame["fg"][entity.x, entity.y] = entity.color
+
+  def _redraw_tile(self, x: int, y: int) -> None:
+    """Redraw a single tile of the cached frame with its topmost entity"""
+    self._frame[x, y] = self._tile_layer[x, y]
+    entities_here = self._entities_by_location.get((x, y))
+    if not entities_here or not self.visible[x, y]:
+      return
+    if self.entity_store is not None:
+      rows = self.entity_store.rows
+      entity = max(entities_here, key=lambda e: (e.render_order.value, rows[e]))
+    else:
+      top = max(e.render_order.value for e in entities_here)
+      topmost = [e for e in entities_here if e.render_order.value == top]
+      entity = topmost[0]
+      if len(topmost) > 1:
+        # Like _draw_entities the one added to the map last is drawn over the others
+        entity = next(e for e in reversed(self.entities) if e in topmost)
+    self._frame["ch"][x, y] = ord(entity.char)
+    self._frame["fg"][x, y] = entity.color
+
+  def render(self, console: Console) -> None:
+    everything = (slice(0, self.width), slice(0, self.height))
+    if self._frame is None or self._frame_tiles_version != self.tiles_version:
+      self._tile_layer = self._compose_tiles(everything)
+      self._frame = self._tile_layer.copy()
+      self._frame_tiles_version = self.tiles_version
+      self._draw_entities(everything)
+    else:
+      # Only redraw what changed since the last frame
+      for bounds in self._dirty_regions:
+        self._tile_layer[bounds] = self._compose_tiles(bounds)
+        self._frame[bounds] = self._tile_layer[bounds]
+        self._draw_entities(bounds)
+      for x, y in self._dirty_tiles:
+        self._redraw_tile(x, y)
+    self._dirty_regions.clear()
+    self._dirty_tiles.clear()
+
+    console.tiles_rgb[0:self.width, 0:self.height] = self._frame
 
 
   @property
@@ -109,7 +592,8 @@ class GameMap:
 
 
 class GameWorld:
-  """Holds the settings for the GameMap and generates new maps for each floor descended"""
+  """Holds the settings for the GameMap and generates new maps for each floor descended.
+  While a floor is being played the next one is built ahead of time on a worker thread"""
   def __init__(
     self,
     *,
@@ -119,7 +603,13 @@ class GameWorld:
     max_rooms: int, 
     room_min_size: int,
     room_max_size: int,
-    current_floor: int = 0
+    current_floor: int = 0,
+    seed: Optional[int] = None,
+    pregenerate: bool = True,
+    memmap_dir: Optional[str] = None,
+    packed_masks: bool = False,
+    floor_cache_budget: int = 64 * 2**20,
+    archive: Optional[str] = None,
   ):
     self.engine = engine
     self.map_width = map_width
@@ -128,15 +618,155 @@ class GameWorld:
     self.room_min_size = room_min_size
     self.room_max_size = room_max_size
     self.current_floor = current_floor
+    self.pregenerate = pregenerate
+    # Passed on to every GameMap
+    self.memmap_dir = memmap_dir
+    self.packed_masks = packed_masks
+    # Every floor of a world with the same seed and settings is identical
+    self.seed = random.getrandbits(63) if seed is None else seed
+    # Floors the player has left, kept so they can be returned to
+    self.floors = FloorCache(floor_cache_budget)
+    # Pregenerated floors, see floor_archive.py, floors it doesn't have are generated as usual
+    self.archive: Optional[FloorArchive] = None
+    if archive is not None:
+      from floor_archive import FloorArchive
+      self.archive = FloorArchive(archive)
+    self._executor: Optional[ThreadPoolExecutor] = None
+    self._pending: Optional[Tuple[FloorKey, Future]] = None
+
+  def __getstate__(self) -> dict:
+    state = self.__dict__.copy()
+    # Threads can't be saved, the next floor is prebuilt again after loading
+    state["_executor"] = None
+    state["_pending"] = None
+    return state
+
+  def __setstate__(self, state: dict) -> None:
+    # Missing from older saves
+    state.setdefault("memmap_dir", None)
+    state.setdefault("packed_masks", False)
+    state.setdefault("floors", FloorCache())
+    state.setdefault("archive", None)
+    state.setdefault("seed", random.getrandbits(63))
+    state.setdefault("pregenerate", True)
+    state.setdefault("_executor", None)
+    state.setdefault("_pending", None)
+    self.__dict__.update(state)
 
   def generate_floor(self) -> None:
+    """Descend to the next floor"""
+    self.change_floor(self.current_floor + 1)
+
+  def change_floor(self, floor: int) -> None:
+    """Move the player to another floor. Floors visited before are restored as they were left,
+    the player arrives on the stairs down when going up and at the start when going down"""
+    going_up = floor < self.current_floor
+    previous_floor = self.current_floor
+    previous_map: Optional[GameMap] = getattr(self.engine, "game_map", None)
+    self.current_floor = floor
+    with self.engine.profiler.phase("procgen"):
+      game_map = self.floors.take(floor, self.engine)
+      if game_map is None:
+        key = self._floor_key(floor)
+        game_map = self._take_pregenerated(key)
+        if game_map is None:
+          game_map = self._load_archived(key)
+        if game_map is None:
+          game_map = self._build_floor(*key)
+      self._enter(game_map, going_up)
+    if previous_map is not None:
+      # Only cached once the player has left it
+      self.floors.put(previous_floor, previous_map)
+    self.pregenerate_next_floor()
+
+  def pregenerate_next_floor(self) -> None:
+    """Start building the floor below the current one in the background"""
+    if not self.pregenerate:
+      return
+    if self.current_floor + 1 in self.floors:
+      return # Already visited
+    key = self._floor_key(self.current_floor + 1)
+    if self.archive is not None and key in self.archive:
+      return # Loaded from the archive when it's entered
+    if self._pending is not None:
+      if self._pending[0] == key:
+        return # Already building it
+      self._pending[1].cancel()
+    if self._executor is None:
+      self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="floor-pregen")
+    self._pending = key, self._executor.submit(self._build_floor, *key)
+
+  @staticmethod
+  def floor_random(seed: int, floor: int) -> Tuple[random.Random, np.random.Generator]:
+    """Return the Python and NumPy random streams for one floor of a seeded world"""
+    python_sequence, numpy_sequence = np.random.SeedSequence([seed, floor]).spawn(2)
+    python_seed = int.from_bytes(python_sequence.generate_state(4).tobytes(), "little")
+    return random.Random(python_seed), np.random.default_rng(numpy_sequence)
+
+  def _floor_key(self, floor: int) -> FloorKey:
+    """Return everything the layout of a floor depends on"""
+    return (
+      floor,
+      self.seed,
+      self.map_width,
+      self.map_height,
+      self.max_rooms,
+      self.room_min_size,
+      self.room_max_size,
+    )
+
+  def _take_pregenerated(self, key: FloorKey) -> Optional[GameMap]:
+    """Return the prebuilt floor if it was built from the same inputs"""
+    if self._pending is None:
+      return None
+    pending_key, future = self._pending
+    self._pending = None
+    if pending_key != key:
+      future.cancel()
+      return None
+    try:
+      return future.result()
+    except Exception:
+      traceback.print_exc()
+      return None # Build it again on this thread
+
+  def _load_archived(self, key: FloorKey) -> Optional[GameMap]:
+    """Return the floor from the archive, None if it isn't archived"""
+    if self.archive is None:
+      return None
+    description = self.archive.describe(key)
+    if description is None:
+      return None
+    return description.build(self.engine, memmap_dir=self.memmap_dir, packed_masks=self.packed_masks)
+
+  def _build_floor(
+    self,
+    floor: int,
+    seed: int,
+    map_width: int,
+    map_height: int,
+    max_rooms: int,
+    room_min_size: int,
+    room_max_size: int,
+  ) -> GameMap:
     from procgen import generate_dungeon
-    self.current_floor += 1
-    self.engine.game_map = generate_dungeon(
-      max_rooms=self.max_rooms,
-      room_min_size=self.room_min_size,
-      room_max_size=self.room_max_size,
-      map_width=self.map_width,
-      map_height=self.map_height,
-      engine=self.engine
+    rng, np_rng = self.floor_random(seed, floor)
+    return generate_dungeon(
+      max_rooms=max_rooms,
+      room_min_size=room_min_size,
+      room_max_size=room_max_size,
+      map_width=map_width,
+      map_height=map_height,
+      engine=self.engine,
+      floor_number=floor,
+      rng=rng,
+      np_rng=np_rng,
+      memmap_dir=self.memmap_dir,
+      packed_masks=self.packed_masks,
     )
+
+  def _enter(self, game_map: GameMap, at_stairs: bool = False) -> None:
+    """Make game_map the current floor and move the player onto it"""
+    location = game_map.stairs_down_location if at_stairs else game_map.player_start_location
+    self.engine.player.place(*location, game_map)
+    self.engine.game_map = game_map
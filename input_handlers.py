@@ -9,6 +9,7 @@ import actions
 import colors
 from equipment_types import EquipmentType
 import exceptions
+import scheduler
 
 if TYPE_CHECKING:
   from engine import Engine
@@ -99,14 +100,18 @@ class EventHandler(BaseEventHandler):
     if action is None:
       return False
 
+    if self.engine.journal:
+      self.engine.journal.record(action) # Impossible actions too, they still add messages
     try:
-      action.perform()
+      with self.engine.profiler.phase("action", type(action).__name__):
+        action.perform()
     except exceptions.Impossible as exc:
       self.engine.message_log.add_message(exc.args[0], colors.impossible)
       return False
 
-    self.engine.handle_enemy_turns()
+    self.engine.handle_enemy_turns(scheduler.delay(self.engine.player, action.cost))
     self.engine.update_fov()
+    self.engine.end_turn()
     return True
 
   def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
@@ -161,6 +166,14 @@ class MainGameEventHandler(EventHandler):
       return LookHandler(self.engine)
     elif key == tcod.event.K_BACKSLASH:
       return DebugSpawnEntityEventHandler(self.engine)
+    elif key == tcod.event.K_F3:
+      profiler = self.engine.profiler
+      profiler.enabled = profiler.show_overlay = not profiler.enabled
+      state = "on" if profiler.enabled else "off"
+      self.engine.message_log.add_message(f"Profiling {state}")
+    elif key == tcod.event.K_F4:
+      self.engine.profiler.dump("profile.json")
+      self.engine.message_log.add_message("Profile written to profile.json")
 
     return action
 
@@ -171,6 +184,8 @@ Handle events after the player is dead
 class GameOverEventHandler(EventHandler):
   def on_quit(self) -> None:
     """Handle exiting out of a finished game"""
+    if self.engine.autosaver:
+      self.engine.autosaver.close() # So an autosave can't recreate the save
     if os.path.exists("savegame.sav"):
       os.remove("savegame.sav") # Delete the active save
     raise exceptions.QuitWithoutSaving()
@@ -551,6 +566,8 @@ class DebugSpawnEntityEventHandler(AskUserEventHandler):
         return None
 
       x,y = player.x, player.y
+      if self.engine.journal:
+        self.engine.journal.record_spawn(index)
       self.engine.game_map.debug_spawn_entity(entity=selected_entity, x=player.x, y=player.y+1) 
       self.engine.message_log.add_message(
         f"DEBUG spawned a {selected_entity.name}"
@@ -0,0 +1,208 @@
+"""
+Action journal.
+
+Records the seed of a game and every action the player attempts, so the game
+can be replayed exactly without a window. Dungeons are generated from the
+seed and monsters only use the floors seeded random streams, so replaying the
+same actions reproduces the same game. A journal takes a few bytes per turn.
+
+  python journal.py savegame.journal --turn 500 --save bug.sav
+
+The file starts with MAGIC and the seed, each record after that is an opcode
+byte and its arguments. Items are recorded by their index in the players
+inventory. Records are only ever appended.
+"""
+from __future__ import annotations
+import argparse
+import os
+import struct
+import time
+from typing import BinaryIO, Iterator, Optional, Tuple, TYPE_CHECKING
+
+import actions
+
+if TYPE_CHECKING:
+  from engine import Engine
+
+MAGIC = b"RGJRNL1\n"
+_SEED = struct.Struct("<q")
+
+# Opcodes and the arguments following them
+BUMP, WAIT, PICKUP, STAIRS, ITEM, DROP, EQUIP, SPAWN = range(1, 9)
+_ARGUMENTS = {
+  BUMP: struct.Struct("<bb"),    # dx, dy
+  WAIT: struct.Struct(""),
+  PICKUP: struct.Struct(""),
+  STAIRS: struct.Struct(""),
+  ITEM: struct.Struct("<Bhh"),   # inventory index, target x, target y
+  DROP: struct.Struct("<B"),     # inventory index
+  EQUIP: struct.Struct("<B"),    # inventory index
+  SPAWN: struct.Struct("<B"),    # index into GameMap.debug_spawnable
+}
+
+Record = Tuple[int, Tuple[int, ...]]
+
+
+def encode(action: actions.Action) -> Record:
+  """Return the opcode and arguments of a player action"""
+  if isinstance(action, actions.ActionWithDirection):
+    return BUMP, (action.dx, action.dy)
+  if isinstance(action, actions.WaitAction):
+    return WAIT, ()
+  if isinstance(action, actions.PickupAction):
+    return PICKUP, ()
+  if isinstance(action, actions.TakeStairsDownAction):
+    return STAIRS, ()
+  if isinstance(action, actions.DropItemAction):
+    return DROP, (_item_index(action),)
+  if isinstance(action, actions.ItemAction):
+    return ITEM, (_item_index(action), *action.target_xy)
+  if isinstance(action, actions.EquipAction):
+    return EQUIP, (_item_index(action),)
+  raise TypeError(f"Can not journal a {type(action).__name__}")
+
+
+def _item_index(action: actions.Action) -> int:
+  return action.entity.inventory.items.index(action.item)
+
+
+def decode(record: Record, engine: Engine) -> Optional[actions.Action]:
+  """Return the player action of a record, None for records which are not actions"""
+  opcode, arguments = record
+  player = engine.player
+  if opcode == BUMP:
+    return actions.BumpAction(player, *arguments)
+  if opcode == WAIT:
+    return actions.WaitAction(player)
+  if opcode == PICKUP:
+    return actions.PickupAction(player)
+  if opcode == STAIRS:
+    return actions.TakeStairsDownAction(player)
+  if opcode == ITEM:
+    index, x, y = arguments
+    return actions.ItemAction(player, player.inventory.items[index], (x, y))
+  if opcode == DROP:
+    return actions.DropItemAction(player, player.inventory.items[arguments[0]])
+  if opcode == EQUIP:
+    return actions.EquipAction(player, player.inventory.items[arguments[0]])
+  if opcode == SPAWN:
+    return None
+  raise ValueError(f"Unknown journal opcode {opcode}")
+
+
+class Journal:
+  """Appends the actions of one game to a file"""
+
+  def __init__(self, filename: str, seed: int):
+    """Start a new journal for a game started with this seed"""
+    self.filename = filename
+    self.seed = seed
+    self._file: BinaryIO = open(filename, "wb")
+    self._file.write(MAGIC + _SEED.pack(seed))
+    self._file.flush()
+
+  @classmethod
+  def resume(cls, filename: str, engine: Engine) -> Optional[Journal]:
+    """Continue the journal of a loaded game.
+    Records after the ones the save was made at are dropped, they belong to turns
+    the save doesn't have. Returns None if the file doesn't match the game"""
+    position = getattr(engine, "journal_position", None)
+    if position is None or not os.path.exists(filename):
+      return None
+    with open(filename, "rb") as f:
+      header = f.read(len(MAGIC) + _SEED.size)
+    if header != MAGIC + _SEED.pack(engine.game_world.seed) or os.path.getsize(filename) < position:
+      return None
+    journal = cls.__new__(cls)
+    journal.filename = filename
+    journal.seed = engine.game_world.seed
+    journal._file = open(filename, "r+b")
+    journal._file.truncate(position)
+    journal._file.seek(position)
+    return journal
+
+  @property
+  def position(self) -> int:
+    """Bytes written so far, saved with the game so it can be resumed"""
+    return self._file.tell()
+
+  def record(self, action: actions.Action) -> None:
+    self._write(*encode(action))
+
+  def record_spawn(self, index: int) -> None:
+    """Record a debug spawn, they change the game without an action"""
+    self._write(SPAWN, (index,))
+
+  def _write(self, opcode: int, arguments: Tuple[int, ...]) -> None:
+    # Flushed every time so the journal survives a crash
+    self._file.write(bytes((opcode,)) + _ARGUMENTS[opcode].pack(*arguments))
+    self._file.flush()
+
+  def close(self) -> None:
+    self._file.close()
+
+
+def read(filename: str) -> Tuple[int, Iterator[Record]]:
+  """Return the seed of a journal and an iterator over its records"""
+  with open(filename, "rb") as f:
+    data = f.read()
+  if not data.startswith(MAGIC):
+    raise ValueError(f"{filename} is not a journal")
+  (seed,) = _SEED.unpack_from(data, len(MAGIC))
+
+  def records() -> Iterator[Record]:
+    offset = len(MAGIC) + _SEED.size
+    while offset < len(data):
+      opcode = data[offset]
+      arguments = _ARGUMENTS[opcode]
+      yield opcode, arguments.unpack_from(data, offset + 1)
+      offset += 1 + arguments.size
+
+  return seed, records()
+
+
+def replay(filename: str, until_turn: Optional[int] = None, pregenerate: bool = True) -> Engine:
+  """Play a journal back without rendering, stopping once until_turn turns have passed"""
+  import input_handlers
+  import setup_game
+
+  seed, records = read(filename)
+  engine = setup_game.new_game(seed=seed)
+  engine.game_world.pregenerate = pregenerate
+  handler = input_handlers.EventHandler(engine)
+  for opcode, arguments in records:
+    if until_turn is not None and engine.turn >= until_turn:
+      break
+    if opcode == SPAWN:
+      player = engine.player
+      entity = engine.game_map.debug_spawnable[arguments[0]]
+      engine.game_map.debug_spawn_entity(entity=entity, x=player.x, y=player.y + 1)
+      continue
+    handler.handle_action(decode((opcode, arguments), engine))
+  return engine
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Replay a game from its action journal.")
+  parser.add_argument("journal", help="journal file to replay")
+  parser.add_argument("--turn", type=int, default=None, help="stop once this many turns have passed")
+  parser.add_argument("--save", default=None, help="save the replayed game to this file")
+  parser.add_argument(
+    "--no-pregenerate", action="store_true", help="build every floor on the main thread"
+  )
+  args = parser.parse_args()
+
+  start = time.perf_counter()
+  engine = replay(args.journal, until_turn=args.turn, pregenerate=not args.no_pregenerate)
+  elapsed = time.perf_counter() - start
+  player = engine.player
+  print(f"turn {engine.turn} on floor {engine.game_world.current_floor}, "
+        f"player at {player.x},{player.y} with {player.fighter.hp}/{player.fighter.max_hp} hp")
+  print(f"replayed in {elapsed:.3f}s ({engine.turn / elapsed if elapsed else 0.0:.1f} turns per second)")
+  if args.save:
+    engine.save_as(args.save)
+    print(f"saved to {args.save}")
+
+
+if __name__ == "__main__":
+  main()
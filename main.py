@@ -1,3 +1,5 @@
+import contextlib
+from typing import ContextManager
 import tcod
 import traceback
 
@@ -9,9 +11,17 @@ import setup_game
 def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
   """If the current event handler has an engine then save it"""
   if isinstance(handler, input_handlers.EventHandler):
+    if handler.engine.autosaver:
+      handler.engine.autosaver.close() # Don't let an older autosave replace this one
     handler.engine.save_as(filename=filename)
     print("Game saved")
 
+def profile_phase(handler: input_handlers.BaseEventHandler, name: str) -> ContextManager[None]:
+  """Time a phase of the frame if the current event handler has an engine"""
+  if isinstance(handler, input_handlers.EventHandler):
+    return handler.engine.profiler.phase(name)
+  return contextlib.nullcontext()
+
 def main() -> None:
   screen_width = 80
   screen_height = 50
@@ -25,8 +35,10 @@ def main() -> None:
     try:
       while True:
         root_console.clear()
-        handler.on_render(console=root_console)
-        context.present(root_console)
+        with profile_phase(handler, "render"):
+          handler.on_render(console=root_console)
+        with profile_phase(handler, "present"):
+          context.present(root_console)
 
         try:
           for event in tcod.event.wait():
@@ -4,9 +4,12 @@ import textwrap
 import tcod
 
 import colors
+from prototypes import restore_slots
 
 
 class Message:
+  __slots__ = ("plain_text", "fg", "count")
+
   def __init__(
     self,
     text: str,
@@ -16,6 +19,9 @@ class Message:
     self.fg = fg
     self.count = 1
 
+  def __setstate__(self, state: object) -> None:
+    restore_slots(self, state) # Messages from older saves were pickled with a __dict__
+
   @property
   def full_text(self) -> str:
     """The full text of this message, including the count if necessary"""
@@ -1,9 +1,11 @@
 from __future__ import annotations
 import random
-from typing import Iterator, List, Tuple, TYPE_CHECKING
+from typing import List, Optional, Set, Tuple, TYPE_CHECKING
 from numpy import diff, tile
-import tcod
+import numpy as np # type: ignore
 from game_map import GameMap
+import prototypes
+from prototypes import restore_slots
 import tile_types
 import difficulty
 
@@ -12,12 +14,17 @@ if TYPE_CHECKING:
   from entity import Entity
 
 class RectangularRoom:
+  __slots__ = ("x1", "y1", "x2", "y2")
+
   def __init__(self, x: int, y: int, width: int, height: int) -> None:
     self.x1 = x
     self.y1 = y
     self.x2 = x + width
     self.y2 = y + height
 
+  def __setstate__(self, state: object) -> None:
+    restore_slots(self, state) # Rooms from older saves were pickled with a __dict__
+
   @property
   def center(self) -> Tuple[int, int]:
     center_x = int((self.x1 + self.x2) / 2)
@@ -39,52 +46,103 @@ class RectangularRoom:
     )
 
 
+class FloorDescription:
+  """
+  A generated floor as plain data: tile IDs, the stairs and player start, the
+  entities to spawn by prototype name and the seed of the random streams the
+  floor uses during play. It doesn't refer to an engine so it can be pickled,
+  sent to another process or stored in a floor archive, see floor_archive.py
+  """
+  __slots__ = ("tiles", "stairs_down_location", "player_start_location", "spawns", "random_seed")
+
+  def __init__(
+    self,
+    tiles: np.ndarray,
+    stairs_down_location: Tuple[int, int] = (0, 0),
+    player_start_location: Tuple[int, int] = (0, 0),
+    spawns: Optional[List[Tuple[str, int, int]]] = None,
+    random_seed: Optional[int] = None,
+  ):
+    self.tiles = tiles
+    self.stairs_down_location = stairs_down_location
+    self.player_start_location = player_start_location
+    self.spawns: List[Tuple[str, int, int]] = [] if spawns is None else spawns # (prototype, x, y)
+    self.random_seed = random_seed
+
+  def build(
+    self, engine: Engine, memmap_dir: Optional[str] = None, packed_masks: bool = False
+  ) -> GameMap:
+    """Return a new game map of this floor with its entities spawned"""
+    width, height = self.tiles.shape
+    dungeon = GameMap(engine, width, height, memmap_dir=memmap_dir, packed_masks=packed_masks)
+    if self.random_seed is not None:
+      dungeon.rng = random.Random(self.random_seed)
+      dungeon.np_rng = np.random.default_rng(self.random_seed)
+    dungeon.tiles[...] = self.tiles
+    dungeon.stairs_down_location = self.stairs_down_location
+    dungeon.player_start_location = self.player_start_location
+    for name, x, y in self.spawns:
+      prototypes.get(name).spawn(dungeon, x, y)
+    dungeon.mark_tiles_changed()
+    return dungeon
+
+
 def place_entities(
   room: RectangularRoom,
-  dungeon: GameMap,
+  floor: FloorDescription,
   floor_number: int,
+  rng: random.Random,
+  spawn_locations: Set[Tuple[int, int]],
 ) -> None:
-  # Place entities in the given room
-  number_of_monsters = random.randint(
+  # Add the entities spawned in the given room to the floor, spawn_locations holds the ones taken so far
+  number_of_monsters = rng.randint(
     0, difficulty.get_max_value_by_floor(difficulty.max_monsters_by_floor, floor_number)
   )
-  number_of_items = random.randint(
+  number_of_items = rng.randint(
     0, difficulty.get_max_value_by_floor(difficulty.max_items_by_floor, floor_number)
   )
 
   monsters: List[Entity] = difficulty.get_random_entities_by_floor(
-    difficulty.enemy_chances, number_of_monsters, floor_number
+    difficulty.enemy_chances, number_of_monsters, floor_number, rng
   )
 
   items: List[Entity] = difficulty.get_random_entities_by_floor(
-    difficulty.item_chances, number_of_items, floor_number
+    difficulty.item_chances, number_of_items, floor_number, rng
   )
 
   for entity in monsters + items:
-    x = random.randint(room.x1 + 1, room.x2 - 1)
-    y = random.randint(room.y1 + 1, room.y2 - 1)
-    if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-      entity.spawn(dungeon, x, y)
-
-
-def tunnel_between(
-  start: Tuple[int, int], end: Tuple[int, int]
-) -> Iterator[Tuple[int, int]]:
-  # Return an L-shaped tunnel between these two points
-  x1, y1 = start
-  x2, y2 = end
-  if random.random() < 0.5:
-    # Move horizontally, then vertically
-    corner_x, corner_y = x2, y1
-  else:
-    # Move vertically, then horizontally
-    corner_x, corner_y = x1, y2
-
-  # Generate the coordiates for this tunnel
-  for x, y in tcod.los.bresenham((x1, y1), (corner_x, corner_y)).tolist():
-    yield x, y
-  for x, y in tcod.los.bresenham((corner_x, corner_y), (x2, y2)).tolist():
-    yield x, y
+    x = rng.randint(room.x1 + 1, room.x2 - 1)
+    y = rng.randint(room.y1 + 1, room.y2 - 1)
+    if (x, y) != floor.player_start_location and (x, y) not in spawn_locations:
+      spawn_locations.add((x, y))
+      floor.spawns.append((entity.prototype, x, y))
+
+
+def tunnels_between(
+  starts: np.ndarray, ends: np.ndarray, horizontal_first: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+  # Return the x and y coordinates of L-shaped tunnels joining each start to its end.
+  # starts and ends are (n, 2) arrays, horizontal_first picks the corner of each tunnel
+  x1, y1 = starts[:, 0], starts[:, 1]
+  x2, y2 = ends[:, 0], ends[:, 1]
+  # Move horizontally then vertically through corner (x2, y1),
+  # or vertically then horizontally through corner (x1, y2)
+  horizontal_y = np.where(horizontal_first, y1, y2)
+  vertical_x = np.where(horizontal_first, x2, x1)
+
+  horizontal_x = _ranges(np.minimum(x1, x2), np.maximum(x1, x2))
+  vertical_y = _ranges(np.minimum(y1, y2), np.maximum(y1, y2))
+  xs = np.concatenate([horizontal_x, np.repeat(vertical_x, np.abs(y2 - y1) + 1)])
+  ys = np.concatenate([np.repeat(horizontal_y, np.abs(x2 - x1) + 1), vertical_y])
+  return xs, ys
+
+
+def _ranges(low: np.ndarray, high: np.ndarray) -> np.ndarray:
+  # Concatenate the inclusive ranges low[i]..high[i] into one array
+  lengths = high - low + 1
+  offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+  return np.arange(lengths.sum()) - offsets + np.repeat(low, lengths)
+
 
 def generate_dungeon(
   max_rooms: int,
@@ -92,46 +150,79 @@ def generate_dungeon(
   room_max_size: int,
   map_width: int,
   map_height: int,
-  engine: Engine
+  engine: Engine,
+  floor_number: int,
+  rng: random.Random,
+  np_rng: np.random.Generator,
+  memmap_dir: Optional[str] = None,
+  packed_masks: bool = False,
 ) -> GameMap:
-  # Generate a new dungeon game map
-  player = engine.player
-  dungeon = GameMap(engine, map_width, map_height, entities=[player])
-
-  rooms: List[RectangularRoom] = []
-  center_of_last_room = (0, 0) # Keep track of center of last room so we can place stairs there
-
-  for r in range(max_rooms):
-    room_width = random.randint(room_min_size, room_max_size)
-    room_height = random.randint(room_min_size, room_max_size)
+  # Generate a new dungeon game map. It only touches the new map, not the player,
+  # so it can run on a worker thread. The player is placed when the floor is entered
+  floor = describe_dungeon(
+    max_rooms, room_min_size, room_max_size, map_width, map_height, floor_number, rng, np_rng
+  )
+  return floor.build(engine, memmap_dir=memmap_dir, packed_masks=packed_masks)
 
-    x = random.randint(0, dungeon.width - room_width - 1)
-    y = random.randint(0, dungeon.height - room_height - 1)
 
+def describe_dungeon(
+  max_rooms: int,
+  room_min_size: int,
+  room_max_size: int,
+  map_width: int,
+  map_height: int,
+  floor_number: int,
+  rng: random.Random,
+  np_rng: np.random.Generator,
+) -> FloorDescription:
+  # Generate the layout and spawns of a dungeon without an engine or game map
+  # Sample every candidate room at once
+  widths = np_rng.integers(room_min_size, room_max_size, size=max_rooms, endpoint=True)
+  heights = np_rng.integers(room_min_size, room_max_size, size=max_rooms, endpoint=True)
+  xs = np_rng.integers(0, map_width - widths - 1, endpoint=True)
+  ys = np_rng.integers(0, map_height - heights - 1, endpoint=True)
+
+  # Candidates are accepted in order, a room is rejected if it touches the area
+  # of any room accepted before it, walls included
+  occupied = np.zeros((map_width, map_height), dtype=bool, order="F")
+  carved = np.zeros((map_width, map_height), dtype=bool, order="F")
+  rooms: List[RectangularRoom] = []
+  for x, y, room_width, room_height in zip(xs.tolist(), ys.tolist(), widths.tolist(), heights.tolist()):
     new_room = RectangularRoom(x, y, room_width, room_height)
-
-    # Run through the other rooms and see if they intersect with this one
-    if any(new_room.intersects(other_room) for other_room in rooms):
-      continue # THis room intersects, try again
-
-    # Dig out this rooms inner area
-    dungeon.tiles[new_room.inner] = tile_types.floor
-
-    if len(rooms) == 0:
-      # The first room is where the player starts
-      player.place(*new_room.center, dungeon)
-    else:
-      # Dig a tunnel between this room and the previous one
-      for x, y in tunnel_between(rooms[-1].center, new_room.center):
-        dungeon.tiles[x, y] = tile_types.floor
-      center_of_last_room = new_room.center
-
-    place_entities(new_room, dungeon, engine.game_world.current_floor)
-
-    # Place stairs leading down in the center of the last room
-    dungeon.tiles[center_of_last_room] = tile_types.stairs_down
-    dungeon.stairs_down_location = center_of_last_room
-
+    area = slice(new_room.x1, new_room.x2 + 1), slice(new_room.y1, new_room.y2 + 1)
+    if occupied[area].any():
+      continue # This room intersects, try again
+    occupied[area] = True
+    carved[new_room.inner] = True # Dig out this rooms inner area
     rooms.append(new_room)
 
-  return dungeon
+  # Dig a tunnel between each room and the previous one
+  if len(rooms) > 1:
+    centers = np.array([room.center for room in rooms])
+    tunnel_x, tunnel_y = tunnels_between(
+      centers[:-1], centers[1:], np_rng.random(len(rooms) - 1) < 0.5
+    )
+    carved[tunnel_x, tunnel_y] = True
+  tiles = np.full((map_width, map_height), tile_types.wall, dtype=tile_types.tile_id_dt, order="F")
+  tiles[carved] = tile_types.floor
+  floor = FloorDescription(tiles)
+
+  center_of_last_room = (0, 0) # Keep track of center of last room so we can place stairs there
+  if rooms:
+    # The first room is where the player starts
+    floor.player_start_location = rooms[0].center
+  if len(rooms) > 1:
+    center_of_last_room = rooms[-1].center
+
+  spawn_locations: Set[Tuple[int, int]] = set()
+  for room in rooms:
+    place_entities(room, floor, floor_number, rng, spawn_locations)
+
+  # Place stairs leading down in the center of the last room
+  tiles[center_of_last_room] = tile_types.stairs_down
+  floor.stairs_down_location = center_of_last_room
+
+  # The streams used during play are seeded from generation, so storing a
+  # floor only takes one number instead of the state of both streams
+  floor.random_seed = rng.getrandbits(63)
+  return floor
@@ -0,0 +1,109 @@
+from __future__ import annotations
+from collections import deque
+import contextlib
+import json
+import time
+from typing import ContextManager, Deque, Dict, Optional, Sequence, TYPE_CHECKING
+
+import colors
+
+if TYPE_CHECKING:
+  from tcod.console import Console
+
+# Shared do-nothing context returned while profiling is disabled
+_DISABLED = contextlib.nullcontext()
+
+
+class _PhaseTimer:
+  __slots__ = ("profiler", "name", "start")
+
+  def __init__(self, profiler: Profiler, name: str):
+    self.profiler = profiler
+    self.name = name
+
+  def __enter__(self) -> None:
+    self.start = time.perf_counter()
+
+  def __exit__(self, *exc_info: object) -> None:
+    self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class Profiler:
+  """
+  Records the wall time of each phase of a turn, keeping a rolling window of
+  samples per phase for percentiles as well as running totals.
+  Does nothing until enabled.
+  """
+
+  def __init__(self, window: int = 500):
+    self.enabled = False
+    self.show_overlay = False
+    self.window = window
+    self.samples: Dict[str, Deque[float]] = {}
+    self.totals: Dict[str, float] = {}
+    self.counts: Dict[str, int] = {}
+
+  def phase(self, name: str, detail: Optional[str] = None) -> ContextManager[None]:
+    """Time a with block as the given phase, detail splits a phase by e.g. class name"""
+    if not self.enabled:
+      return _DISABLED
+    return _PhaseTimer(self, f"{name}.{detail}" if detail else name)
+
+  def record(self, name: str, seconds: float) -> None:
+    samples = self.samples.get(name)
+    if samples is None:
+      samples = self.samples[name] = deque(maxlen=self.window)
+    samples.append(seconds)
+    self.totals[name] = self.totals.get(name, 0.0) + seconds
+    self.counts[name] = self.counts.get(name, 0) + 1
+
+  def reset(self) -> None:
+    self.samples.clear()
+    self.totals.clear()
+    self.counts.clear()
+
+  def total(self, prefix: str) -> float:
+    """Return the total time of a phase including all of its detailed phases"""
+    return sum(
+      seconds for name, seconds in self.totals.items()
+      if name == prefix or name.startswith(prefix + ".")
+    )
+
+  def percentiles(self, name: str, points: Sequence[float] = (50, 90, 99)) -> Dict[str, float]:
+    """Return the percentiles of the recent samples of a phase, in seconds"""
+    ordered = sorted(self.samples[name])
+    last = len(ordered) - 1
+    return {f"p{point:g}": ordered[round(last * point / 100)] for point in points}
+
+  def summary(self) -> Dict[str, Dict[str, float]]:
+    return {
+      name: {
+        **self.percentiles(name),
+        "total": self.totals[name],
+        "count": self.counts[name],
+      }
+      for name in sorted(self.samples)
+    }
+
+  def dump(self, filename: str) -> None:
+    """Write the current summary of every phase to a JSON file"""
+    with open(filename, "w") as f:
+      json.dump(self.summary(), f, indent=2)
+
+  def render(self, console: Console, x: int, y: int) -> None:
+    """Draw a table of recent percentiles per phase, in milliseconds"""
+    names = sorted(self.samples)
+    width = 40
+    console.draw_frame(
+      x=x, y=y, width=width, height=len(names) + 3, title="Profile (ms)",
+      clear=True, fg=colors.white, bg=colors.black,
+    )
+    console.print(x + 1, y + 1, f"{'phase':<20}{'p50':>6}{'p90':>6}{'p99':>6}", fg=colors.white)
+    for i, name in enumerate(names):
+      values = self.percentiles(name)
+      console.print(
+        x + 1,
+        y + 2 + i,
+        f"{name[:20]:<20}" + "".join(f"{values[p] * 1000:6.2f}" for p in ("p50", "p90", "p99")),
+        fg=colors.white,
+      )
@@ -0,0 +1,182 @@
+from __future__ import annotations
+import copy
+import enum
+from typing import Any, Dict, List, Optional, Tuple, TypeVar, TYPE_CHECKING
+
+if TYPE_CHECKING:
+  from entity import Entity
+
+T = TypeVar("T", bound="Entity")
+
+# Field values which can be shared between a template and all of its copies
+_SHARED_TYPES = (type(None), bool, int, float, str, tuple, enum.Enum, type)
+
+
+class _ObjectRecipe:
+  """
+  Precompiled instructions for copying one object of a template,
+  either the entity itself or one of its components
+  """
+
+  def __init__(self, obj: Any, owner: Optional[Any] = None):
+    self.cls = type(obj)
+    self.back_references: List[str] = []                 # Fields pointing at the owner
+    self.shared: List[Tuple[str, Any]] = []              # Immutable fields
+    self.lists: List[Tuple[str, list]] = []              # Lists which need a fresh copy
+    self.children: List[Tuple[str, _ObjectRecipe]] = []  # Owned component objects
+    for name, value in _fields(obj):
+      if owner is not None and value is owner:
+        self.back_references.append(name)
+      elif isinstance(value, _SHARED_TYPES):
+        self.shared.append((name, value))
+      elif isinstance(value, list):
+        if not all(isinstance(element, _SHARED_TYPES) for element in value):
+          raise ValueError(f"{self.cls.__name__}.{name} holds objects which can not be shared")
+        self.lists.append((name, value))
+      elif _has_fields(value) and not _is_entity(value):
+        self.children.append((name, _ObjectRecipe(value, owner=obj)))
+      else:
+        raise ValueError(f"{self.cls.__name__}.{name} can not be copied by a recipe")
+
+  def build(self, owner: Optional[Any] = None) -> Any:
+    obj = self.cls.__new__(self.cls)
+    self.reset(obj, owner)
+    return obj
+
+  def reset(self, obj: Any, owner: Optional[Any] = None) -> None:
+    """Overwrite obj so it matches the template again, reusing its components"""
+    for name in self.back_references:
+      setattr(obj, name, owner)
+    for name, value in self.shared:
+      setattr(obj, name, value)
+    for name, value in self.lists:
+      setattr(obj, name, list(value))
+    for name, recipe in self.children:
+      child = getattr(obj, name, None)
+      if type(child) is recipe.cls:
+        recipe.reset(child, obj)
+      else:
+        setattr(obj, name, recipe.build(obj))
+
+
+def _slot_names(cls: type) -> Tuple[str, ...]:
+  names: List[str] = []
+  for klass in reversed(cls.__mro__):
+    slots = klass.__dict__.get("__slots__", ())
+    names.extend((slots,) if isinstance(slots, str) else slots)
+  return tuple(name for name in names if name not in ("__dict__", "__weakref__"))
+
+
+def restore_slots(obj: Any, state: Any, defaults: Optional[Dict[str, Any]] = None) -> None:
+  """__setstate__ for classes with __slots__.
+  Also takes the __dict__ state of objects pickled before their class had slots,
+  slots the state doesn't have are set from defaults"""
+  if isinstance(state, tuple):
+    # (__dict__ state, slot state) as pickled from a slotted object
+    dict_state, slot_state = state
+    state = {**(dict_state or {}), **(slot_state or {})}
+  for name, value in {**(defaults or {}), **state}.items():
+    setattr(obj, name, value)
+
+
+def _fields(obj: Any) -> List[Tuple[str, Any]]:
+  """Return the (name, value) pairs set on obj, from both its slots and its __dict__"""
+  fields = [
+    (name, getattr(obj, name)) for name in _slot_names(type(obj)) if hasattr(obj, name)
+  ]
+  fields.extend(getattr(obj, "__dict__", {}).items())
+  return fields
+
+
+def _has_fields(value: Any) -> bool:
+  return hasattr(value, "__dict__") or bool(_slot_names(type(value)))
+
+
+def _is_entity(value: Any) -> bool:
+  from entity import Entity
+  return isinstance(value, Entity)
+
+
+class Recipe:
+  """Builds copies of a registered template entity"""
+
+  def __init__(self, name: str, template: Entity):
+    self.name = name
+    self.template = template # Also keeps the template alive so its id stays unique
+    self._recipe = _ObjectRecipe(template)
+
+  def build(self) -> Entity:
+    if pool is not None:
+      entity = pool.acquire(self.name)
+      if entity is not None:
+        self._recipe.reset(entity)
+        return entity
+    return self._recipe.build()
+
+
+class EntityPool:
+  """Holds discarded entities so they can be reused by the next spawn of the same prototype"""
+
+  def __init__(self, max_per_prototype: int = 256):
+    self.max_per_prototype = max_per_prototype
+    self._free: Dict[str, List[Entity]] = {}
+
+  def __len__(self) -> int:
+    return sum(len(entities) for entities in self._free.values())
+
+  def release(self, entity: Entity) -> None:
+    """Give an entity which is no longer referenced by the game back to the pool"""
+    if entity.prototype is None:
+      return
+    free = self._free.setdefault(entity.prototype, [])
+    if len(free) < self.max_per_prototype:
+      free.append(entity)
+
+  def acquire(self, prototype: str) -> Optional[Entity]:
+    try:
+      return self._free[prototype].pop()
+    except (KeyError, IndexError):
+      return None
+
+
+_recipes_by_name: Dict[str, Recipe] = {}
+_recipes_by_template: Dict[int, Recipe] = {}
+
+# The object pool is optional, spawning always allocates while this is None
+pool: Optional[EntityPool] = None
+
+
+def register(name: str, template: T) -> T:
+  """Register a template entity so copies of it are built from a precompiled recipe"""
+  if name in _recipes_by_name:
+    raise ValueError(f"A prototype named {name!r} is already registered")
+  template.prototype = name
+  recipe = Recipe(name, template)
+  _recipes_by_name[name] = recipe
+  _recipes_by_template[id(template)] = recipe
+  return template
+
+
+def get(name: str) -> Entity:
+  """Return the template registered under this name"""
+  return _recipes_by_name[name].template
+
+
+def instantiate(template: T) -> T:
+  """Return a new copy of template, unregistered entities fall back to a deepcopy"""
+  recipe = _recipes_by_template.get(id(template))
+  if recipe is None or recipe.template is not template:
+    return copy.deepcopy(template)
+  return recipe.build()
+
+
+def enable_pool(max_per_prototype: int = 256) -> EntityPool:
+  global pool
+  pool = EntityPool(max_per_prototype)
+  return pool
+
+
+def release(entity: Entity) -> None:
+  """Recycle an entity if the object pool is enabled"""
+  if pool is not None:
+    pool.release(entity)
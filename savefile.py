@@ -0,0 +1,321 @@
+"""
+Save file format.
+
+A save starts with MAGIC and the length of a JSON header listing its sections.
+Each section is stored with its own codec:
+
+  tiles, visible, explored  raw buffers of the current maps arrays, or of the
+                            bits of visible and explored when they are packed
+  messages                  the message log as JSON records
+  entities                  the entities on the current map, pickled as objects
+  map, engine               the pickled remaining state of the map and engine
+  floors/<floor>            the saved map of each floor in the floor cache
+
+A single map which isn't the current one is saved the same way, without the
+messages and engine sections.
+
+Entities are not stored as records, their components and AIs are slotted
+objects referring to each other and are pickled along with them.
+The pickled sections refer to the engine, the map, the message log and the
+entities on the map by id instead of embedding them, so each section stays
+small. Map arrays only go through their own sections, never through pickle.
+The floor cache has already saved every floor it holds the same way, a
+snapshot only links their files and write copies them in, so only the current
+floor is pickled.
+Section offsets are relative to the first page boundary after the header.
+Uncompressed array sections start on a page boundary, so maps with memory
+mapped layers are saved raw and their layers are mapped copy-on-write on load.
+Files which don't start with MAGIC are loaded as the old LZMA compressed pickle.
+"""
+from __future__ import annotations
+from concurrent.futures import Future
+import io
+import json
+import lzma
+import mmap
+import os
+import pickle
+import struct
+import zlib
+from typing import Any, BinaryIO, Callable, Dict, List, Tuple
+
+import numpy as np # type: ignore
+
+from bitmask import BitMask
+from engine import Engine
+from entity_store import EntityStore
+from game_map import GameMap
+from message_log import Message, MessageLog
+
+MAGIC = b"RGSAVE1\n"
+VERSION = 2
+_PAGE = mmap.ALLOCATIONGRANULARITY
+_HEADER_LENGTH = struct.Struct("<I")
+
+# Codec name: (compress, decompress)
+CODECS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+  "none": (bytes, bytes),
+  "zlib": (lambda data: zlib.compress(data, 1), zlib.decompress),
+  "lzma": (lzma.compress, lzma.decompress),
+}
+DEFAULT_CODEC = "zlib"
+
+# GameMap fields which are saved in their own sections or rebuilt on load
+_MAP_ARRAYS = {"tiles": "tiles", "visible": "visible", "explored": "expolored"}
+_MAP_REBUILT = ("entities", "_entities_by_location", "_entity_locations", "entity_store")
+
+
+class _Pickler(pickle.Pickler):
+  def __init__(self, file: io.BytesIO, references: Dict[int, Any]):
+    super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+    self.references = references
+
+  def persistent_id(self, obj: Any) -> Any:
+    return self.references.get(id(obj))
+
+
+class _Unpickler(pickle.Unpickler):
+  def __init__(self, file: io.BytesIO, resolve: Callable[[Any], Any]):
+    super().__init__(file)
+    self.resolve = resolve
+
+  def persistent_load(self, pid: Any) -> Any:
+    return self.resolve(pid)
+
+
+def _dumps(obj: Any, references: Dict[int, Any]) -> bytes:
+  buffer = io.BytesIO()
+  _Pickler(buffer, references).dump(obj)
+  return buffer.getvalue()
+
+
+def _loads(data: bytes, resolve: Callable[[Any], Any]) -> Any:
+  return _Unpickler(io.BytesIO(data), resolve).load()
+
+
+# A save which has been pickled but not yet compressed or written, as (info, data) pairs.
+# Sections with a "file" hold a future of a filename, the file is read when the
+# section is written and removed afterwards
+Snapshot = List[Tuple[Dict[str, Any], bytes]]
+
+
+def _map_sections(game_map: GameMap, references: Dict[int, Any]) -> Snapshot:
+  """Serialize the sections of one map. Its entities are added to references by index"""
+  entities = list(game_map.entities)
+  sections: Snapshot = []
+  for name, attribute in _MAP_ARRAYS.items():
+    array = getattr(game_map, attribute)
+    info: Dict[str, Any] = {"name": name}
+    if isinstance(array, BitMask):
+      info["mask_shape"] = list(array.shape)
+      array = array.bits
+    info.update(dtype=np.lib.format.dtype_to_descr(array.dtype), shape=list(array.shape))
+    if game_map.memmap_dir is not None:
+      info["codec"] = "none" # Stored raw so the layer can be mapped again on load
+    sections.append((info, np.asfortranarray(array).tobytes(order="F")))
+  sections.append(({"name": "entities"}, _dumps(entities, references)))
+
+  references.update((id(entity), i) for i, entity in enumerate(entities))
+  map_state = game_map.__getstate__()
+  for name in (*_MAP_ARRAYS.values(), *_MAP_REBUILT):
+    del map_state[name]
+  map_state["use_entity_store"] = game_map.entity_store is not None
+  sections.append(({"name": "map"}, _dumps(map_state, references)))
+  return sections
+
+
+def snapshot_map(game_map: GameMap) -> Snapshot:
+  """Serialize a map which isn't the current one, it is loaded again by load_map"""
+  return _map_sections(game_map, {id(game_map.engine): "engine", id(game_map): "map"})
+
+
+def snapshot(engine: Engine) -> Snapshot:
+  """Serialize every section of the engine, the result no longer shares any state with it"""
+  # The engine, map and message log are referenced by name and entities by index
+  references: Dict[int, Any] = {
+    id(engine): "engine",
+    id(engine.game_map): "map",
+    id(engine.message_log): "messages",
+  }
+  sections = _map_sections(engine.game_map, references)
+
+  engine_state = engine.__getstate__()
+  del engine_state["game_map"], engine_state["message_log"]
+  messages = [
+    [message.plain_text, list(message.fg), message.count]
+    for message in engine.message_log.messages
+  ]
+  sections.append(({"name": "messages"}, json.dumps(messages).encode("utf-8")))
+  sections.append(({"name": "engine"}, _dumps(engine_state, references)))
+  for floor, link in engine.game_world.floors.link_files().items():
+    sections.append(({"name": f"floors/{floor}", "codec": "none", "file": link}, b""))
+  return sections
+
+
+def discard(sections: Snapshot) -> None:
+  """Remove the files linked by a snapshot which won't be written"""
+  for info, _ in sections:
+    if "file" in info:
+      info["file"].add_done_callback(_remove_linked)
+
+
+def _remove_linked(link: Future) -> None:
+  if link.exception() is None and os.path.exists(link.result()):
+    os.remove(link.result())
+
+
+def _align(offset: int) -> int:
+  return -(-offset // _PAGE) * _PAGE
+
+
+def write(
+  sections: Snapshot, filename: str, codec: str = DEFAULT_CODEC, magic: bytes = MAGIC
+) -> None:
+  """Compress a snapshot and write it to filename, sections may override the codec.
+  The file is written under a temporary name first so a crash never leaves a partial save.
+  Other sectioned files, like floor archives, start with their own magic"""
+  try:
+    _write(sections, filename, codec, magic)
+  finally:
+    discard(sections)
+
+
+def _write(sections: Snapshot, filename: str, codec: str, magic: bytes) -> None:
+  header: Dict[str, Any] = {"version": VERSION, "sections": []}
+  payloads: List[Tuple[int, bytes]] = []
+  offset = 0
+  for info, data in sections:
+    if "file" in info:
+      info = info.copy()
+      with open(info.pop("file").result(), "rb") as f:
+        data = f.read()
+    section_codec = info.get("codec", codec)
+    payload = CODECS[section_codec][0](data)
+    if section_codec == "none" and "dtype" in info:
+      offset = _align(offset)
+    header["sections"].append({
+      **info, "codec": section_codec, "offset": offset, "size": len(payload), "raw_size": len(data)
+    })
+    payloads.append((offset, payload))
+    offset += len(payload)
+  encoded_header = json.dumps(header).encode("utf-8")
+  data_start = _align(len(magic) + _HEADER_LENGTH.size + len(encoded_header))
+
+  temporary = filename + ".tmp"
+  with open(temporary, "wb") as f:
+    f.write(magic)
+    f.write(_HEADER_LENGTH.pack(len(encoded_header)))
+    f.write(encoded_header)
+    for offset, payload in payloads:
+      f.seek(data_start + offset)
+      f.write(payload)
+    f.flush()
+    os.fsync(f.fileno())
+  os.replace(temporary, filename)
+
+
+def save(engine: Engine, filename: str, codec: str = DEFAULT_CODEC) -> None:
+  """Write the engine to filename, compressing every section with codec"""
+  write(snapshot(engine), filename, codec)
+
+
+class SectionReader:
+  """Reads the sections of a save, or another file written by write, from an open file after its magic"""
+
+  def __init__(self, f: BinaryIO, magic: bytes = MAGIC):
+    self.f = f
+    (header_length,) = _HEADER_LENGTH.unpack(f.read(_HEADER_LENGTH.size))
+    header = json.loads(f.read(header_length))
+    if header["version"] > VERSION:
+      raise ValueError(f"Save file version {header['version']} is newer than this game")
+    data_start = _align(len(magic) + _HEADER_LENGTH.size + header_length)
+
+    self.infos: Dict[str, Dict[str, Any]] = {}
+    for info in header["sections"]:
+      info["offset"] += data_start
+      self.infos[info["name"]] = info
+
+  def read(self, name: str) -> bytes:
+    info = self.infos[name]
+    self.f.seek(info["offset"])
+    return CODECS[info["codec"]][1](self.f.read(info["size"]))
+
+
+def _load_map(
+  reader: SectionReader, filename: str, named: Dict[str, Any]
+) -> Tuple[GameMap, Callable[[Any], Any]]:
+  """Rebuild the map of a save. named must hold the engine and any other named references.
+  Also returns the function resolving references to the map and its entities"""
+  game_map = GameMap.__new__(GameMap)
+  named = {**named, "map": game_map}
+  entities = _loads(reader.read("entities"), named.__getitem__)
+  resolve = lambda pid: entities[pid] if isinstance(pid, int) else named[pid]
+
+  map_state = _loads(reader.read("map"), resolve)
+  use_entity_store = map_state.pop("use_entity_store")
+  map_state.setdefault("memmap_dir", None) # Missing from older saves
+  for name, attribute in _MAP_ARRAYS.items():
+    info = reader.infos[name]
+    dtype = np.lib.format.descr_to_dtype(info["dtype"])
+    shape = tuple(info["shape"])
+    if map_state["memmap_dir"] is not None and info["codec"] == "none":
+      # Changes to the layer stay in memory and never reach the save file
+      map_state[attribute] = np.memmap(
+        filename, dtype=dtype, mode="c", offset=info["offset"], shape=shape, order="F"
+      )
+    else:
+      map_state[attribute] = np.frombuffer(
+        reader.read(name), dtype=dtype
+      ).reshape(shape, order="F").copy(order="F")
+    if "mask_shape" in info:
+      map_state[attribute] = BitMask(tuple(info["mask_shape"]), map_state[attribute])
+
+  map_state.update(
+    entities={},
+    _entities_by_location={},
+    _entity_locations={},
+    entity_store=EntityStore() if use_entity_store else None,
+  )
+  game_map.__setstate__(map_state)
+  for entity in entities:
+    game_map.add_entity(entity)
+  return game_map, resolve
+
+
+def load_map(filename: str, engine: Engine) -> GameMap:
+  """Load a map written from snapshot_map"""
+  with open(filename, "rb") as f:
+    if f.read(len(MAGIC)) != MAGIC:
+      raise ValueError(f"{filename} is not a saved map")
+    game_map, _ = _load_map(SectionReader(f), filename, {"engine": engine})
+  return game_map
+
+
+def load(filename: str) -> Engine:
+  """Load an engine from filename, in either the sectioned or the old format"""
+  with open(filename, "rb") as f:
+    if f.read(len(MAGIC)) != MAGIC:
+      f.seek(0)
+      engine = pickle.loads(lzma.decompress(f.read()))
+      assert isinstance(engine, Engine)
+      engine.game_map.index_entities() # Saves from before the spatial index
+      return engine
+
+    reader = SectionReader(f)
+    engine = Engine.__new__(Engine)
+    message_log = MessageLog()
+    for text, fg, count in json.loads(reader.read("messages")):
+      message = Message(text, tuple(fg))
+      message.count = count
+      message_log.messages.append(message)
+    game_map, resolve = _load_map(reader, filename, {"engine": engine, "messages": message_log})
+    engine_state = _loads(reader.read("engine"), resolve)
+    evicted = {
+      int(name.split("/")[1]): reader.read(name) for name in reader.infos if name.startswith("floors/")
+    }
+
+  engine_state.update(game_map=game_map, message_log=message_log)
+  engine.__setstate__(engine_state)
+  for floor, data in evicted.items():
+    engine.game_world.floors.restore(floor, data)
+  return engine
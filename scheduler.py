@@ -0,0 +1,68 @@
+from __future__ import annotations
+import heapq
+from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+  from entity import Actor
+
+TURN = 100         # Time taken by a normal action at normal speed
+NORMAL_SPEED = 100
+
+
+def delay(actor: Actor, cost: int) -> int:
+  """Return the time an action of this cost takes the actor, faster actors take less"""
+  speed = getattr(actor, "speed", NORMAL_SPEED) # Actors from older saves have no speed
+  return max(1, cost * NORMAL_SPEED // speed)
+
+
+class Scheduler:
+  """
+  Queues the actors of a map by the time of their next action.
+  Actors due at the same time act in the order they were scheduled, so a
+  game replays identically. Only queued actors are ever touched, an actor
+  which isn't rescheduled after acting stays dormant until scheduled again.
+  """
+
+  def __init__(self) -> None:
+    self.now = 0
+    self._heap: List[Tuple[int, int, Actor]] = []
+    self._queued: Dict[Actor, Tuple[int, int]] = {} # The live entry of each actor in the heap
+    self._next_sequence = 0
+
+  def __contains__(self, actor: Actor) -> bool:
+    return actor in self._queued
+
+  def __len__(self) -> int:
+    return len(self._queued)
+
+  def __getstate__(self) -> dict:
+    state = self.__dict__.copy()
+    # Leave out stale entries, they may hold actors which have left the map
+    state["_heap"] = [(due, sequence, actor) for actor, (due, sequence) in self._queued.items()]
+    heapq.heapify(state["_heap"])
+    return state
+
+  def schedule(self, actor: Actor, wait: int = 0) -> None:
+    """Queue the actor to act wait time from now, replacing any earlier entry"""
+    entry = (self.now + wait, self._next_sequence)
+    self._next_sequence += 1
+    self._queued[actor] = entry
+    heapq.heappush(self._heap, (*entry, actor))
+
+  def unschedule(self, actor: Actor) -> None:
+    # The heap entry is skipped when it comes up
+    self._queued.pop(actor, None)
+
+  def advance(self, time: int) -> Iterator[Actor]:
+    """Move time forward, yielding each actor whose time comes before the end in order.
+    Yielded actors are unqueued, actors scheduled during iteration are yielded too if due"""
+    end = self.now + time
+    heap = self._heap
+    while heap and heap[0][0] < end:
+      due, sequence, actor = heapq.heappop(heap)
+      if self._queued.get(actor) != (due, sequence):
+        continue # Unscheduled or rescheduled since
+      del self._queued[actor]
+      self.now = due
+      yield actor
+    self.now = end
@@ -1,22 +1,25 @@
 from __future__ import annotations
-import copy
 from typing import Optional
 import tcod
-import lzma
-import pickle
 import traceback
 
+from autosave import AutoSaver
 import colors
 from engine import Engine
 import entity_factories
 import input_handlers
 from game_map import GameWorld
+from journal import Journal
+import prototypes
+import savefile
 
 background_image = tcod.image.load("menu_background.png")[:,:,:3]
 
 
-def new_game() -> Engine:
-  """Return a brand new game session as an Engine instance."""
+def new_game(seed: Optional[int] = None, floor_archive: Optional[str] = None) -> Engine:
+  """Return a brand new game session as an Engine instance.
+  Games started with the same seed generate the same dungeon.
+  Floors found in floor_archive are loaded from it instead of generated."""
   map_width = 80
   map_height = 43
 
@@ -24,7 +27,7 @@ def new_game() -> Engine:
   room_min_size = 6
   max_rooms = 30
 
-  player = copy.deepcopy(entity_factories.player)
+  player = prototypes.instantiate(entity_factories.player)
 
   engine = Engine(player=player)
 
@@ -35,6 +38,8 @@ def new_game() -> Engine:
     room_max_size=room_max_size,
     map_width=map_width,
     map_height=map_height,
+    seed=seed,
+    archive=floor_archive,
   )
   engine.game_world.generate_floor()
   engine.update_fov()
@@ -46,10 +51,25 @@ def new_game() -> Engine:
 
 
 def load_game(filename: str) -> Engine:
-  """Load an engine instance from a file"""
-  with open(filename, "rb") as f:
-    engine = pickle.loads(lzma.decompress(f.read()))
-  assert isinstance(engine, Engine)
+  """Load an engine instance from a file, old LZMA pickled saves still load"""
+  engine = savefile.load(filename)
+  engine.game_world.pregenerate_next_floor()
+  return engine
+
+
+def with_autosave(engine: Engine, filename: str = "savegame.sav") -> Engine:
+  """Autosave this engine to filename in the background while it's played"""
+  engine.autosaver = AutoSaver(filename)
+  return engine
+
+
+def with_journal(engine: Engine, filename: str = "savegame.journal", resume: bool = False) -> Engine:
+  """Record the players actions to filename so the game can be replayed with journal.py.
+  A loaded game resumes its journal when it still matches, a new game starts one"""
+  if resume:
+    engine.journal = Journal.resume(filename, engine)
+  else:
+    engine.journal = Journal(filename, engine.game_world.seed)
   return engine
 
 
@@ -102,7 +122,9 @@ class MainMenu(input_handlers.BaseEventHandler):
       raise SystemExit()
     elif event.sym == tcod.event.K_c:
       try:
-        return input_handlers.MainGameEventHandler(load_game("savegame.sav"))
+        return input_handlers.MainGameEventHandler(
+          with_autosave(with_journal(load_game("savegame.sav"), resume=True))
+        )
       except FileNotFoundError:
         return input_handlers.PopupMessage(self, "No saved game to load.")
       except Exception as exc:
@@ -111,6 +133,6 @@ class MainMenu(input_handlers.BaseEventHandler):
 
       pass
     elif event.sym == tcod.event.K_n:
-      return input_handlers.MainGameEventHandler(new_game())
+      return input_handlers.MainGameEventHandler(with_autosave(with_journal(new_game())))
 
     return None
\ No newline at end of file
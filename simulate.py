@@ -0,0 +1,222 @@
+"""
+Headless simulation harness.
+
+Plays the game without a window: a bot picks the player's actions and they
+are fed to EventHandler.handle_action exactly like keyboard input would be.
+Useful for soak testing and for benchmarking changes to the turn loop.
+
+  python simulate.py --turns 5000 --seed 1 --bot explorer
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import time
+from typing import Callable, Dict, Optional, Tuple, TYPE_CHECKING
+import numpy as np # type: ignore
+import tcod
+
+import actions
+from components.consumable import HealingConsumable
+from entity import Item
+import input_handlers
+import setup_game
+
+if TYPE_CHECKING:
+  from engine import Engine
+
+CARDINAL_DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+
+class Bot:
+  """Chooses the players next action"""
+
+  def __init__(self, rng: random.Random):
+    self.rng = rng
+
+  def choose_action(self, engine: Engine) -> actions.Action:
+    raise NotImplementedError()
+
+
+class RandomBot(Bot):
+  """Wanders at random, picks up whatever it stands on and takes any stairs it finds"""
+
+  def choose_action(self, engine: Engine) -> actions.Action:
+    player = engine.player
+    if (player.x, player.y) == engine.game_map.stairs_down_location:
+      return actions.TakeStairsDownAction(player)
+    if self.rng.random() < 0.1:
+      return actions.PickupAction(player)
+    if self.rng.random() < 0.05:
+      return actions.WaitAction(player)
+    return actions.BumpAction(player, *self.rng.choice(CARDINAL_DIRECTIONS))
+
+
+class ExplorerBot(Bot):
+  """Heads for the stairs, fighting anything in the way and drinking potions when hurt"""
+
+  def __init__(self, rng: random.Random):
+    super().__init__(rng)
+    self._stairs_distance: Optional[np.ndarray] = None
+    self._stairs_key: Optional[Tuple[int, Tuple[int, int]]] = None
+
+  def stairs_distance(self, engine: Engine) -> np.ndarray:
+    game_map = engine.game_map
+    key = id(game_map), game_map.stairs_down_location
+    if key != self._stairs_key:
+      distance = tcod.path.maxarray((game_map.width, game_map.height), dtype=np.int32, order="F")
+      distance[game_map.stairs_down_location] = 0
+      cost = np.array(game_map.walkable, dtype=np.int8)
+      tcod.path.dijkstra2d(distance, cost, 1, 0, out=distance)
+      self._stairs_distance, self._stairs_key = distance, key
+    return self._stairs_distance
+
+  def choose_action(self, engine: Engine) -> actions.Action:
+    player = engine.player
+    game_map = engine.game_map
+
+    if player.fighter.hp < player.fighter.max_hp * 0.4:
+      for item in player.inventory.items:
+        if isinstance(item.consumable, HealingConsumable):
+          return actions.ItemAction(player, item)
+
+    for dx, dy in CARDINAL_DIRECTIONS:
+      if game_map.get_actor_at_location(player.x + dx, player.y + dy):
+        return actions.BumpAction(player, dx, dy)
+
+    if (player.x, player.y) == game_map.stairs_down_location:
+      return actions.TakeStairsDownAction(player)
+
+    if len(player.inventory.items) < player.inventory.capacity:
+      for entity in game_map.get_entities_at_location(player.x, player.y):
+        if isinstance(entity, Item):
+          return actions.PickupAction(player)
+
+    distance = self.stairs_distance(engine)
+    path = tcod.path.hillclimb2d(distance, (player.x, player.y), True, False)
+    if len(path) > 1 and self.rng.random() < 0.9:
+      next_x, next_y = path[1].tolist()
+      return actions.BumpAction(player, next_x - player.x, next_y - player.y)
+    return actions.BumpAction(player, *self.rng.choice(CARDINAL_DIRECTIONS))
+
+
+BOTS: Dict[str, Callable[[random.Random], Bot]] = {
+  "random": RandomBot,
+  "explorer": ExplorerBot,
+}
+
+
+class SimulationStats:
+  """Counters and timings collected over a simulation run"""
+
+  def __init__(self) -> None:
+    self.turns = 0
+    self.attempted_actions = 0
+    self.floors_descended = 0
+    self.deaths = 0
+    self.games = 0
+    self.wall_time = 0.0
+    self.phase_times: Dict[str, float] = {"ai": 0.0, "fov": 0.0, "procgen": 0.0}
+
+  @property
+  def turns_per_second(self) -> float:
+    return self.turns / self.wall_time if self.wall_time else 0.0
+
+  def as_dict(self) -> Dict[str, object]:
+    return {
+      "turns": self.turns,
+      "attempted_actions": self.attempted_actions,
+      "turns_per_second": self.turns_per_second,
+      "floors_descended": self.floors_descended,
+      "deaths": self.deaths,
+      "games": self.games,
+      "wall_time": self.wall_time,
+      "phase_times": dict(self.phase_times),
+    }
+
+  def report(self) -> str:
+    lines = [
+      f"turns:            {self.turns} ({self.attempted_actions} actions attempted)",
+      f"turns per second: {self.turns_per_second:.1f}",
+      f"floors descended: {self.floors_descended}",
+      f"games / deaths:   {self.games} / {self.deaths}",
+      f"wall time:        {self.wall_time:.3f}s",
+    ]
+    for phase, seconds in self.phase_times.items():
+      share = seconds / self.wall_time if self.wall_time else 0.0
+      lines.append(f"  {phase:<8} {seconds:8.3f}s {share:6.1%}")
+    return "\n".join(lines)
+
+
+# Simulation phases and the engine profiler phases they are summed from
+PROFILER_PHASES = {"ai": "enemy_turns", "fov": "fov", "procgen": "procgen"}
+
+
+def _collect_phase_times(engine: Engine, stats: SimulationStats) -> None:
+  for phase, profiler_phase in PROFILER_PHASES.items():
+    stats.phase_times[phase] += engine.profiler.total(profiler_phase)
+
+
+def run(
+  turns: int,
+  seed: int = 0,
+  bot: str = "explorer",
+  pregenerate: bool = False,
+) -> SimulationStats:
+  """Play until the given number of turns have passed, starting new games after each death.
+  Floors are built on the main thread so procgen is measured, with pregenerate they are
+  built on the background worker and procgen only counts the time spent waiting for them"""
+  stats = SimulationStats()
+  rng = random.Random(seed)
+  player_bot = BOTS[bot](rng)
+  engine: Optional[Engine] = None
+  handler: Optional[input_handlers.EventHandler] = None
+  start = time.perf_counter()
+
+  while stats.turns < turns:
+    if engine is None or not engine.player.is_alive:
+      if engine is not None:
+        stats.deaths += 1
+        _collect_phase_times(engine, stats)
+      engine = setup_game.new_game(seed=seed + stats.games)
+      engine.game_world.pregenerate = pregenerate
+      engine.profiler.enabled = True
+      handler = input_handlers.EventHandler(engine)
+      stats.games += 1
+
+    action = player_bot.choose_action(engine)
+    floor = engine.game_world.current_floor
+    stats.attempted_actions += 1
+    if handler.handle_action(action):
+      stats.turns += 1
+      stats.floors_descended += engine.game_world.current_floor - floor
+    elif stats.attempted_actions > turns * 10:
+      break # The bot is stuck repeating impossible actions
+
+  stats.wall_time = time.perf_counter() - start
+  if engine is not None:
+    _collect_phase_times(engine, stats)
+  return stats
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Run the game headlessly with a bot player.")
+  parser.add_argument("--turns", type=int, default=2000, help="turns to simulate")
+  parser.add_argument("--seed", type=int, default=0, help="seed for the dungeon and the bot")
+  parser.add_argument("--bot", choices=sorted(BOTS), default="explorer", help="player policy")
+  parser.add_argument(
+    "--pregenerate", action="store_true",
+    help="build floors on the background worker like the game, procgen only times waiting for them",
+  )
+  parser.add_argument("--json", action="store_true", help="print the results as JSON")
+  args = parser.parse_args()
+
+  stats = run(args.turns, seed=args.seed, bot=args.bot, pregenerate=args.pregenerate)
+  if args.json:
+    print(json.dumps(stats.as_dict(), indent=2))
+  else:
+    print(stats.report())
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,16 @@
+import os
+import sys
+import warnings
+
+import pytest
+
+# The game modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings("ignore", category=FutureWarning, module="tcod")
+
+
+@pytest.fixture(autouse=True)
+def validate_spatial_index(monkeypatch):
+  # Every change to the entities of a map verifies the whole spatial index
+  from game_map import GameMap
+  monkeypatch.setattr(GameMap, "validate_spatial_index", True)
@@ -0,0 +1,29 @@
+"""Playing games in tests"""
+import random
+
+import input_handlers
+import simulate
+
+
+def play(engine, turns, seed=0):
+  handler = input_handlers.EventHandler(engine)
+  bot = simulate.ExplorerBot(random.Random(seed))
+  while engine.turn < turns and engine.player.is_alive:
+    handler.handle_action(bot.choose_action(engine))
+  return engine
+
+
+def state(engine):
+  game_map = engine.game_map
+  return (
+    engine.turn,
+    engine.game_world.current_floor,
+    engine.game_world.seed,
+    game_map.tiles.tobytes(),
+    game_map.expolored[...].tobytes(),
+    game_map.stairs_down_location,
+    [(e.name, e.x, e.y, getattr(getattr(e, "fighter", None), "hp", None)) for e in game_map.entities],
+    [item.name for item in engine.player.inventory.items],
+    [(m.plain_text, m.count) for m in engine.message_log.messages],
+    game_map.rng.getstate(),
+  )
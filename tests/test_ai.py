@@ -0,0 +1,60 @@
+import pytest
+
+from components.ai import HostileEnemy
+import entity_factories
+from game_map import GameMap
+import setup_game
+import tile_types
+
+
+def chase():
+  """An awake orc with a cached path to the player across an open room"""
+  engine = setup_game.new_game(seed=1)
+  game_map = GameMap(engine, 20, 9)
+  game_map.tiles[1:-1, 1:-1] = tile_types.floor
+  engine.game_map = game_map
+  engine.player.place(2, 4, game_map)
+  engine.update_fov()
+  orc = entity_factories.orc.spawn(game_map, 9, 4)
+  orc.ai.sleeping = False
+  engine.handle_enemy_turns()
+  assert (orc.x, orc.y) == (8, 4) and orc.ai.has_path
+  return engine, orc
+
+
+def block_next_steps(orc):
+  """Put a sleeping troll on the path, two steps ahead of the orc"""
+  x, y = orc.ai.path[orc.ai.path_index + 1]
+  troll = entity_factories.troll.spawn(orc.game_map, x, y - 1)
+  troll.move(0, 1)
+  return x, y
+
+
+@pytest.mark.parametrize("enemy_turn", [False, True])
+def test_blocked_path_is_repaired(monkeypatch, enemy_turn):
+  engine, orc = chase()
+  player = engine.player
+  blocked = block_next_steps(orc)
+  recomputed = []
+  monkeypatch.setattr(HostileEnemy, "set_path", lambda self, *args: recomputed.append(self.entity))
+
+  if enemy_turn: # Repaired downhill on the shared distance map
+    start = orc.x, orc.y
+    engine.handle_enemy_turns()
+    assert (orc.x, orc.y) != start # Walked on instead of stalling
+  else: # Repaired with a detour of its own
+    assert orc.ai.path_is_valid((player.x, player.y))
+  assert orc not in recomputed # The troll may wake up and chase too
+  assert blocked not in orc.ai.path[orc.ai.path_index:]
+  assert orc.ai.path[-1] == (player.x, player.y)
+  for (x1, y1), (x2, y2) in zip(orc.ai.path[orc.ai.path_index:], orc.ai.path[orc.ai.path_index + 1:]):
+    assert abs(x1 - x2) + abs(y1 - y2) == 1
+
+
+def test_orc_reaches_the_player_around_blockers():
+  engine, orc = chase()
+  block_next_steps(orc)
+  for _ in range(12):
+    engine.handle_enemy_turns()
+  player = engine.player
+  assert abs(orc.x - player.x) + abs(orc.y - player.y) == 1
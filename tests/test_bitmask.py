@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from bitmask import BitMask
+
+SHAPES = [(5, 8), (7, 13), (3, 1), (9, 30)]
+
+KEYS = [
+  (2, 3),
+  (np.int64(1), np.int64(0)),
+  (slice(None), slice(None)),
+  (slice(1, 4), slice(2, 7)),
+  (slice(0, 3), slice(5, None)),
+  (slice(None), slice(None, None, 2)),
+  (slice(4, 1, -1), slice(0, 9)),
+  (1, slice(0, 6)),
+  (slice(1, 3), 0),
+  Ellipsis,
+  2,
+  (np.array([0, 1, 2, 2]), np.array([0, 0, 5, 7])),
+  ([1, 0], [2, 3]),
+]
+
+
+def masks(shape, seed=0):
+  array = np.random.default_rng(seed).random(shape) < 0.5
+  return BitMask.from_array(array), array
+
+
+def clip(key, shape):
+  """Keep scalar and fancy indices inside small shapes"""
+  if key is Ellipsis:
+    return key
+  if not isinstance(key, tuple):
+    return clip((key, slice(None)), shape)[0]
+  clipped = []
+  for index, size in zip(key, shape):
+    if isinstance(index, slice):
+      clipped.append(index)
+    else:
+      clipped.append(np.asarray(index) % size if not np.isscalar(index) else type(index)(index % size))
+  return tuple(clipped)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("key", KEYS, ids=repr)
+def test_get(shape, key):
+  mask, array = masks(shape)
+  key = clip(key, shape)
+  expected = array[key]
+  result = mask[key]
+  if np.ndim(expected) == 0:
+    assert type(result) is bool and result == expected
+  else:
+    assert result.dtype == bool
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("key", KEYS, ids=repr)
+@pytest.mark.parametrize("value", [True, False])
+def test_set(shape, key, value):
+  mask, array = masks(shape, seed=1)
+  key = clip(key, shape)
+  mask[key] = value
+  array[key] = value
+  np.testing.assert_array_equal(mask.to_array(), array)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_set_arrays(shape):
+  mask, array = masks(shape, seed=2)
+  region = np.random.default_rng(3).random(array[1:, 1:].shape) < 0.5
+  mask[1:, 1:] = region
+  array[1:, 1:] = region
+  np.testing.assert_array_equal(mask.to_array(), array)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_boolean_mask(shape):
+  mask, array = masks(shape, seed=4)
+  selection = np.random.default_rng(5).random(shape) < 0.3
+  np.testing.assert_array_equal(mask[selection], array[selection])
+  mask[selection] = True
+  array[selection] = True
+  np.testing.assert_array_equal(mask.to_array(), array)
+  assert mask.count() == array.sum()
+  assert mask.any() == array.any()
+  np.testing.assert_array_equal(np.asarray(mask), array)
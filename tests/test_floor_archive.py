@@ -0,0 +1,33 @@
+import numpy as np
+
+import floor_archive
+from floor_archive import FloorArchive
+
+
+def key(floor, seed):
+  return (floor, seed, 80, 43, 30, 6, 10)
+
+
+def test_round_trip(tmp_path):
+  filename = str(tmp_path / "test.floors")
+  keys = [key(floor, seed) for seed in (1, 2) for floor in (1, 2)]
+  floors = [(floor_key, floor_archive.describe_floor(floor_key)) for floor_key in keys]
+  floor_archive.write(filename, floors)
+  archive = FloorArchive(filename)
+  for floor_key, description in floors:
+    loaded = archive.describe(floor_key)
+    np.testing.assert_array_equal(loaded.tiles, description.tiles)
+    assert loaded.spawns == description.spawns
+    assert loaded.stairs_down_location == description.stairs_down_location
+  assert key(3, 1) not in archive
+  assert (1, 1, 40, 43, 30, 6, 10) not in archive # Other map settings
+  archive.close()
+
+
+def test_empty_archive(tmp_path):
+  filename = str(tmp_path / "empty.floors")
+  floor_archive.write(filename, [])
+  archive = FloorArchive(filename)
+  assert key(1, 1) not in archive
+  assert archive.describe(key(1, 1)) is None
+  archive.close()
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+import tcod
+
+import entity_factories
+from game_map import BLOCKER_COST, GameMap
+from helpers import play
+import savefile
+import setup_game
+import tile_types
+
+
+def test_spatial_index_after_moves_and_removals():
+  engine = setup_game.new_game(seed=11)
+  engine.player.fighter.max_hp = engine.player.fighter.hp = 10**6
+  play(engine, 300) # Walking, fighting, picking up and using items
+  game_map = engine.game_map
+  player = engine.player
+
+  orc = entity_factories.orc.spawn(game_map, player.x, player.y)
+  assert orc in game_map.get_entities_at_location(player.x, player.y)
+  orc.place(0, 0)
+  assert orc not in game_map.get_entities_at_location(player.x, player.y)
+  assert game_map.get_actor_at_location(0, 0) is orc
+  orc.move(1, 1)
+  assert game_map.get_blocking_entity_at_location(1, 1) is orc
+  orc.fighter.die()
+  assert game_map.get_blocking_entity_at_location(1, 1) is None
+  game_map.remove_entity(orc)
+  assert game_map.get_entities_at_location(1, 1) == ()
+  game_map.check_spatial_index()
+
+
+def test_save_round_trip_keeps_index(tmp_path):
+  engine = play(setup_game.new_game(seed=2), 200)
+  filename = str(tmp_path / "game.sav")
+  engine.save_as(filename)
+  loaded = savefile.load(filename)
+  for entity in loaded.game_map.entities:
+    assert entity in loaded.game_map.get_entities_at_location(entity.x, entity.y)
+  play(loaded, 300) # Validated after every change
+  loaded.game_map.check_spatial_index()
+
+
+def test_incremental_path_cost():
+  engine = play(setup_game.new_game(seed=7), 50)
+  game_map = engine.game_map
+  game_map.get_path_cost() # Built now, only updated from here on
+  free = [
+    (x, y) for x, y in np.argwhere(game_map.walkable).tolist()
+    if game_map.get_blocking_entity_at_location(x, y) is None
+  ]
+
+  orcs = [entity_factories.orc.spawn(game_map, x, y) for x, y in free[:6]]
+  orcs[0].place(*free[10]) # Moved
+  orcs[1].place(orcs[2].x, orcs[2].y) # Stacked on another blocker
+  orcs[3].fighter.die() # No longer blocks
+  game_map.remove_entity(orcs[4])
+  orcs[5].place(0, 0) # Onto a wall, which keeps its cost of 0
+  entity_factories.troll.spawn(game_map, *free[11])
+  incremental = game_map.get_path_cost().copy()
+
+  expected = np.array(game_map.walkable, dtype=np.int8)
+  for entity in game_map.entities:
+    if entity.blocks_movement and expected[entity.x, entity.y]:
+      expected[entity.x, entity.y] += BLOCKER_COST
+  np.testing.assert_array_equal(incremental, expected)
+  game_map.mark_tiles_changed() # Forces a fresh build
+  np.testing.assert_array_equal(incremental, game_map.get_path_cost())
+
+
+@pytest.mark.parametrize("use_entity_store", [False, True])
+def test_incremental_render_matches_full_render(use_entity_store):
+  engine = setup_game.new_game(seed=1)
+  game_map = GameMap(engine, 10, 10, use_entity_store=use_entity_store)
+  game_map.tiles[...] = tile_types.floor
+  game_map.visible[...] = True
+  console = tcod.console.Console(10, 10, order="F")
+  game_map.render(console)
+
+  # Items stacked on one tile, the last one added to the map is on top
+  entity_factories.health_potion.spawn(game_map, 2, 2)
+  entity_factories.dagger.spawn(game_map, 2, 2)
+  sword = entity_factories.short_sword.spawn(game_map, 2, 3)
+  entity_factories.orc.spawn(game_map, 5, 5)
+  game_map.render(console)
+  sword.place(2, 2) # Last in the spatial index, not in the map
+  game_map.render(console)
+  incremental = console.rgb.copy()
+
+  game_map._clear_render_cache()
+  game_map.render(console)
+  np.testing.assert_array_equal(incremental, console.rgb)
+  assert chr(console.rgb["ch"][2, 2]) == sword.char
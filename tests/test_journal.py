@@ -0,0 +1,30 @@
+from helpers import play, state
+import journal
+import savefile
+import setup_game
+
+
+def test_journal_replay(tmp_path):
+  filename = str(tmp_path / "game.journal")
+  engine = setup_game.with_journal(setup_game.new_game(seed=4), filename)
+  play(engine, 200)
+  engine.journal.close()
+
+  assert state(journal.replay(filename)) == state(engine)
+  assert state(journal.replay(filename, pregenerate=False)) == state(engine)
+  assert state(journal.replay(filename, until_turn=100)) == state(play(setup_game.new_game(seed=4), 100))
+
+
+def test_resumed_journal_replay(tmp_path):
+  filename = str(tmp_path / "game.journal")
+  engine = setup_game.with_journal(setup_game.new_game(seed=6), filename)
+  play(engine, 100)
+  engine.save_as(str(tmp_path / "game.sav"))
+  play(engine, 150) # Turns the save doesn't have, dropped when the journal is resumed
+  engine.journal.close()
+
+  loaded = setup_game.with_journal(savefile.load(str(tmp_path / "game.sav")), filename, resume=True)
+  assert loaded.journal is not None
+  play(loaded, 200, seed=1)
+  loaded.journal.close()
+  assert state(journal.replay(filename)) == state(loaded)
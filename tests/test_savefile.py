@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pytest
+
+import actions
+from helpers import play, state
+import input_handlers
+import savefile
+import setup_game
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+@pytest.mark.parametrize("codec", sorted(savefile.CODECS))
+def test_round_trip(tmp_path, codec):
+  engine = play(setup_game.new_game(seed=5), 150)
+  filename = str(tmp_path / "game.sav")
+  engine.save_as(filename, codec)
+  loaded = savefile.load(filename)
+  assert state(loaded) == state(engine)
+  assert loaded.player.parent is loaded.game_map
+  loaded.game_map.check_spatial_index()
+
+
+def test_loaded_game_plays_on_identically(tmp_path):
+  engine = play(setup_game.new_game(seed=3), 60)
+  filename = str(tmp_path / "game.sav")
+  engine.save_as(filename)
+  loaded = savefile.load(filename)
+  play(engine, 120, seed=1)
+  play(loaded, 120, seed=1)
+  assert state(loaded) == state(engine)
+
+
+def test_legacy_save():
+  # Written as an LZMA pickle by the game before the sectioned format and __slots__
+  engine = savefile.load(os.path.join(DATA, "baseline.sav"))
+  game_map = engine.game_map
+  game_map.check_spatial_index()
+  assert engine.player in game_map.entities
+  assert engine.player.equipment.weapon is not None
+  assert len(engine.player.inventory.items) == 6
+  assert engine.message_log.messages
+
+  handler = input_handlers.EventHandler(engine)
+  for dx in (1, -1) * 5:
+    handler.handle_action(actions.BumpAction(engine.player, dx, 0))
+  game_map.check_spatial_index()
+  assert engine.turn > 0
+
+
+@pytest.mark.parametrize("budget", [0, 64 * 2**20])
+def test_cached_floors(tmp_path, budget):
+  engine = setup_game.new_game(seed=9)
+  world = engine.game_world
+  world.floors.budget = budget # With 0 every floor left is only kept on disk
+  world.floors.directory = str(tmp_path)
+  tiles = {}
+  for floor in (2, 3):
+    tiles[world.current_floor] = engine.game_map.tiles.copy()
+    world.change_floor(floor)
+  assert len(world.floors) == 2
+
+  # The player going back to a floor before the snapshot is written doesn't lose it
+  sections = savefile.snapshot(engine)
+  world.change_floor(1)
+  filename = str(tmp_path / "game.sav")
+  savefile.write(sections, filename)
+  assert not [name for name in os.listdir(tmp_path) if name[-1].isdigit()] # The links were removed
+
+  loaded = savefile.load(filename)
+  assert loaded.game_world.current_floor == 3
+  for floor in (1, 2):
+    loaded.game_world.change_floor(floor)
+    assert (loaded.game_map.tiles == tiles[floor]).all()
+
+
+def test_arrays_skip_pickle(monkeypatch):
+  engine = play(setup_game.new_game(seed=5), 100)
+  for floor in (2, 3, 4):
+    engine.game_world.change_floor(floor)
+  pickled = []
+
+  def persistent_id(self, obj):
+    if isinstance(obj, np.ndarray) and obj.size > 64:
+      pickled.append(obj.shape)
+    return self.references.get(id(obj))
+
+  monkeypatch.setattr(savefile._Pickler, "persistent_id", persistent_id)
+  sections = savefile.snapshot(engine)
+  savefile.discard(sections)
+  assert not pickled
+  assert sorted(info["name"] for info, _ in sections if info["name"].startswith("floors/")) == [
+    "floors/1", "floors/2", "floors/3"
+  ]
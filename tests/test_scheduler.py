@@ -0,0 +1,79 @@
+import entity_factories
+from game_map import GameMap
+import scheduler
+from scheduler import NORMAL_SPEED, TURN, Scheduler
+import setup_game
+import tile_types
+
+
+class Actor:
+  def __init__(self, name, speed=NORMAL_SPEED):
+    self.name = name
+    self.speed = speed
+
+  def __repr__(self):
+    return self.name
+
+
+def run(queue, turns):
+  """Advance turn by turn, rescheduling every actor after a normal action"""
+  order = []
+  for _ in range(turns):
+    for actor in queue.advance(TURN):
+      order.append(actor.name)
+      queue.schedule(actor, scheduler.delay(actor, TURN))
+  return order
+
+
+def test_speeds():
+  queue = Scheduler()
+  actors = [Actor("slow", 50), Actor("normal"), Actor("fast", 200)]
+  for actor in actors:
+    queue.schedule(actor)
+  order = run(queue, 4)
+  assert order.count("fast") == 8
+  assert order.count("normal") == 4
+  assert order.count("slow") == 2
+  assert order[:3] == ["slow", "normal", "fast"] # All due at 0, in the order scheduled
+  assert queue.now == 4 * TURN
+
+
+def test_ties_act_in_scheduled_order():
+  queue = Scheduler()
+  actors = [Actor(name) for name in "cab"]
+  for actor in actors:
+    queue.schedule(actor, 10)
+  queue.schedule(actors[0], 10) # Rescheduled, now after the others
+  assert [actor.name for actor in queue.advance(TURN)] == ["a", "b", "c"]
+  assert len(queue) == 0
+
+
+def test_unscheduled_actors_are_skipped():
+  queue = Scheduler()
+  a, b = Actor("a"), Actor("b")
+  queue.schedule(a)
+  queue.schedule(b)
+  queue.unschedule(a)
+  assert a not in queue
+  assert list(queue.advance(TURN)) == [b]
+
+
+def test_dead_actors_leave_the_schedule():
+  engine = setup_game.new_game(seed=1)
+  game_map = GameMap(engine, 20, 5)
+  game_map.tiles[1:-1, 1:-1] = tile_types.floor
+  engine.game_map = game_map
+  engine.player.place(1, 2, game_map)
+  engine.update_fov()
+  orc = entity_factories.orc.spawn(game_map, 3, 2)
+  troll = entity_factories.troll.spawn(game_map, 5, 2)
+  assert orc in game_map.scheduler and troll in game_map.scheduler # Spawned in view
+
+  orc.fighter.die()
+  engine.handle_enemy_turns()
+  assert orc not in game_map.scheduler
+  assert troll in game_map.scheduler
+  game_map.remove_entity(troll)
+  assert troll not in game_map.scheduler
+  engine.handle_enemy_turns()
+  assert len(game_map.scheduler) == 0
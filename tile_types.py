@@ -21,20 +21,46 @@ tile_dt = np.dtype(
   ]
 )
 
+# Maps store one tile ID per cell, an index into palette
+tile_id_dt = np.dtype(np.uint8)
+
+# fog represents unexplored, unseen tiles
+fog = np.array((ord(" "), (255, 255, 255), (0, 0, 0)), dtype=graphic_dt)
+
+# Every defined tile type, indexed by tile ID
+palette = np.zeros(0, dtype=tile_dt)
+# The graphics of each tile ID when unexplored, explored and in FOV, see graphics_index
+graphics = np.zeros((0, 3), dtype=graphic_dt)
+
 def new_tile(
   *,
   walkable: int,
   transparent: int,
   dark: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]],
   light: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]],
-) -> np.ndarray:
+) -> int:
   """
-  Helper function for defining a new tile type
+  Helper function for defining a new tile type, returns its tile ID
   """
-  return np.array((walkable, transparent, dark, light), dtype=tile_dt)
+  global palette, graphics
+  tile_id = len(palette)
+  if tile_id > np.iinfo(tile_id_dt).max:
+    raise ValueError("Too many tile types for tile_id_dt")
+  tile = np.array((walkable, transparent, dark, light), dtype=tile_dt)
+  palette = np.append(palette, tile)
+  graphics = np.append(graphics, [[fog, tile["dark"], tile["light"]]], axis=0)
+  return tile_id
 
-# fog represents unexplored, unseen tiles
-fog = np.array((ord(" "), (255, 255, 255), (0, 0, 0)), dtype=graphic_dt)
+def graphics_index(visible: np.ndarray, explored: np.ndarray) -> np.ndarray:
+  """Return the column of graphics to draw for each cell: 0 unexplored, 1 explored, 2 in FOV"""
+  return np.where(visible, 2, explored).astype(np.uint8)
+
+def ids_from_records(tiles: np.ndarray) -> np.ndarray:
+  """Convert an array of full tile_dt records, as stored by older saves, to tile IDs"""
+  ids = np.zeros(tiles.shape, dtype=tile_id_dt, order="F")
+  for tile_id, tile in enumerate(palette):
+    ids[tiles == tile] = tile_id
+  return ids
 
 # Floor tile
 floor = new_tile(